@@ -0,0 +1,62 @@
+"""Compare base disk clone methods on a sparse test file.
+
+    python benchmarks/clone.py --dir /var/lib/libvirt/images/miqbox --size 4 --data 25
+"""
+import os
+import shutil
+import time
+
+import click
+
+from miqbox.clone import clone
+from miqbox.clone import METHODS
+
+CHUNK = 4 * 1024 * 1024
+
+
+def sparse_file(path, size, data):
+    """Create file of size GiB with data percent of it written in scattered chunks"""
+    total = size * 1024 * 1024 * 1024
+    step = int(CHUNK * 100 / data)
+    payload = os.urandom(CHUNK)
+
+    with open(path, "wb") as f:
+        f.truncate(total)
+        for offset in range(0, total - CHUNK, step):
+            f.seek(offset)
+            f.write(payload)
+
+
+@click.command()
+@click.option("--dir", "directory", default=".", help="Scratch directory (pool filesystem)")
+@click.option("--size", default=2, help="Test file size in GiB")
+@click.option("--data", default=25, help="Percent of file holding data")
+def main(directory, size, data):
+    source = os.path.join(directory, "clone-bench-source.img")
+    destination = os.path.join(directory, "clone-bench-destination.img")
+    sparse_file(source, size, data)
+
+    try:
+        click.echo("{:<18s}{:>10s}{:>16s}".format("Method", "Seconds", "Allocated MiB"))
+        for method in ["shutil.copyfile"] + list(METHODS):
+            start = time.monotonic()
+            try:
+                if method == "shutil.copyfile":
+                    shutil.copyfile(source, destination)
+                else:
+                    clone(source, destination, method=method)
+            except OSError as e:
+                click.echo(f"{method:<18s}{'n/a':>10s}   ({e.strerror})")
+                continue
+            elapsed = time.monotonic() - start
+            allocated = os.stat(destination).st_blocks * 512 // (1024 * 1024)
+            click.echo(f"{method:<18s}{elapsed:>10.2f}{allocated:>16d}")
+            os.remove(destination)
+    finally:
+        for path in (source, destination):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,63 @@
-import click
+import importlib
 
-from miqbox.configuration import config
-from miqbox.images import images
-from miqbox.images import pull
-from miqbox.images import rmi
-from miqbox.miqbox import create
-from miqbox.miqbox import evmserver
-from miqbox.miqbox import kill
-from miqbox.miqbox import start
-from miqbox.miqbox import status
-from miqbox.miqbox import stop
+import click
 
+# command name: (module, attribute); modules are imported only for command being run so
+# daemon backed commands do not pay for libvirt, paramiko and requests imports
+COMMANDS = {
+    # Image commands
+    "images": ("miqbox.images", "images"),
+    "pull": ("miqbox.images", "pull"),
+    "rmi": ("miqbox.images", "rmi"),
+    "mirror": ("miqbox.mirror", "mirror"),
+    # MiqBox command
+    "status": ("miqbox.remote", "status"),
+    # Appliance operations commands
+    "create": ("miqbox.miqbox", "create"),
+    "start": ("miqbox.remote", "start"),
+    "stop": ("miqbox.remote", "stop"),
+    "kill": ("miqbox.remote", "kill"),
+    "evmserver": ("miqbox.remote", "evmserver"),
+    "exec": ("miqbox.remote", "exec_"),
+    "qos": ("miqbox.miqbox", "qos"),
+    "logs": ("miqbox.logs", "logs"),
+    # Fleet command
+    "apply": ("miqbox.fleet", "apply"),
+    # Database commands
+    "db-dump": ("miqbox.backup", "db_dump"),
+    "db-restore": ("miqbox.backup", "db_restore"),
+    # Snapshot commands
+    "snapshot": ("miqbox.miqbox", "snapshot"),
+    "snapshots": ("miqbox.miqbox", "snapshots"),
+    "revert": ("miqbox.miqbox", "revert"),
+    # Idle appliance commands
+    "reap": ("miqbox.reaper", "reap"),
+    "keepalive": ("miqbox.reaper", "keepalive"),
+    # Memory density command
+    "balloon": ("miqbox.density", "balloon"),
+    # Configuration command
+    "config": ("miqbox.configuration", "config"),
+}
 
-@click.version_option()
-@click.group()
-def main():
-    """Spin ManageIQ/CFME Appliance locally with Virtualization."""
-    pass
 
+class LazyGroup(click.Group):
+    """Group importing command modules on first use"""
 
-# Image commands
-main.add_command(images)
-main.add_command(pull)
-main.add_command(rmi)
+    def list_commands(self, ctx):
+        return sorted(COMMANDS)
 
-# MiqBox command
-main.add_command(status)
+    def get_command(self, ctx, name):
+        if name not in COMMANDS:
+            return None
+        module, attribute = COMMANDS[name]
+        return getattr(importlib.import_module(module), attribute)
 
-# Appliance operations commands
-main.add_command(create)
-main.add_command(start)
-main.add_command(stop)
-main.add_command(kill)
-main.add_command(evmserver)
 
-# Configuration command
-main.add_command(config)
+@click.version_option()
+@click.group(cls=LazyGroup)
+def main():
+    """Spin ManageIQ/CFME Appliance locally with Virtualization."""
+    pass
 
 
 if __name__ == "__main__":
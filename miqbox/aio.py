@@ -0,0 +1,191 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from miqbox.configuration import Configuration
+from miqbox.daemon import Service
+from miqbox.exception import ImageError
+from miqbox.images import Images
+
+
+class AsyncMiqBox(object):
+    """asyncio MiqBox
+
+    Blocking libvirt, paramiko and HTTP calls run in bounded thread pools; per operation
+    semaphores limit how many of each run at once.
+
+    Args:
+        workers (int): threads for libvirt and HTTP calls
+        ssh_workers (int): threads for ssh sessions and commands
+        limits (dict): operation (list/create/start/stop/kill/exec/wait/pull): max concurrent
+    """
+
+    def __init__(self, workers=None, ssh_workers=None, limits=None):
+        conf = Configuration().aio
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or conf.workers, thread_name_prefix="miqbox-aio"
+        )
+        self._ssh_executor = ThreadPoolExecutor(
+            max_workers=ssh_workers or conf.ssh_workers, thread_name_prefix="miqbox-aio-ssh"
+        )
+        self._limits = {**conf.limits, **(limits or {})}
+        self._semaphores = {}
+        self._service = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        """Shutdown thread pools"""
+        self._executor.shutdown(wait=False)
+        self._ssh_executor.shutdown(wait=False)
+
+    def _semaphore(self, operation):
+        # created on first use so it binds to the running loop
+        if operation not in self._semaphores:
+            self._semaphores[operation] = asyncio.Semaphore(self._limits.get(operation, 16))
+        return self._semaphores[operation]
+
+    async def _run(self, operation, func, *args, ssh=False, **kwargs):
+        executor = self._ssh_executor if ssh else self._executor
+        async with self._semaphore(operation):
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, functools.partial(func, *args, **kwargs)
+            )
+
+    @property
+    def service(self):
+        """service keeping libvirt connection and ssh sessions shared across calls"""
+        if self._service is None:
+            self._service = Service()
+        return self._service
+
+    async def list(self, status=None):
+        """Information of appliances
+
+        Args:
+            status (str): running, shut off, paused, idle, crashed, no state
+
+        Returns:
+            list: dicts having id, name, state, hostname, saved
+        """
+        return await self._run("list", self.service.status, status=status)
+
+    async def create(self, image, name, cpu=1, memory=4, db_size=5, timeout=900, **kwargs):
+        """Create and start appliance from local image
+
+        As the cli, waits for appliance address, configures database if asked (over ssh or
+        from seed drive) and waits for Web-UI, then lifts provisioning QoS.
+
+        Args:
+            image (str): local image name
+            name (str): name of appliance
+            cpu (int): cpu count
+            memory (int): memory in GB
+            db_size (int): database disk size in GB
+            timeout (int): seconds to wait for address and Web-UI each
+            kwargs: `MiqBox.provision` options (profile, volume, seed, configure, ssh_keys)
+
+        Returns:
+            str: name of appliance
+
+        Raises:
+            asyncio.TimeoutError: appliance not ready in time
+        """
+        kwargs.setdefault("progress", False)
+        box = self.service.box
+        app = await self._run("create", box.provision, name, image, cpu, memory, db_size, **kwargs)
+
+        await self.wait_ready(app.name, timeout=timeout, ui=False)
+        if kwargs.get("configure"):
+            if not kwargs.get("seed"):
+                await self._run("create", app.configure, ssh=True)
+            await self.wait_ready(app.name, timeout=timeout)
+        await self._run("create", app.set_qos, box.qos.serving)
+        return app.name
+
+    async def start(self, name, fresh=False):
+        return await self._run("start", self.service.start, name, fresh=fresh)
+
+    async def stop(self, name, save=False):
+        return await self._run("stop", self.service.stop, name, save=save)
+
+    async def kill(self, name):
+        return await self._run("kill", self.service.kill, name)
+
+    async def exec(self, name, command):
+        """Run command on running appliance over ssh
+
+        Returns:
+            dict: rc, stdout, stderr
+        """
+        return await self._run("exec", self.service.exec, name, command, ssh=True)
+
+    async def hostname(self, name):
+        """Appliance address; None until assigned"""
+        app = await self._run("wait", self.service.appliance, name)
+        hostname = await self._run("wait", lambda: app.hostname)
+        return hostname if hostname.count(".") == 3 else None
+
+    async def wait_ready(self, name, timeout=900, interval=5, ui=True):
+        """Wait for appliance address and Web-UI
+
+        Args:
+            name (str): name of appliance
+            timeout (int): seconds to wait
+            interval (int): seconds between probes
+            ui (bool): also wait for Web-UI
+
+        Returns:
+            str: appliance hostname
+
+        Raises:
+            asyncio.TimeoutError: appliance not ready in time
+        """
+        deadline = time.monotonic() + timeout
+        app = await self._run("wait", self.service.appliance, name)
+
+        while time.monotonic() < deadline:
+            hostname = await self._run("wait", lambda: app.hostname)
+            if hostname.count(".") == 3 and (
+                not ui or await self._run("wait", lambda: app.is_web_ui_running)
+            ):
+                return hostname
+            await asyncio.sleep(interval)
+        raise asyncio.TimeoutError(f"{name} not ready in {timeout}s")
+
+    async def pull(self, image, rate=None):
+        """Download image from remote repository if not available locally
+
+        Args:
+            image (str): image name
+            rate (int): bandwidth limit in bytes per second
+
+        Returns:
+            bool: True if downloaded
+
+        Raises:
+            ImageError: repository or network not available
+        """
+
+        def _pull():
+            images = Images.instantiate_with_image(image)
+            if image in images.images(local=True):
+                return False
+            try:
+                images.download(image, rate=rate, progress=False)
+            except SystemExit:
+                # Images reports repository and network errors to cli user and exits
+                raise ImageError(f"Unable to download {image} from {images.stream} repository")
+            except requests.exceptions.RequestException as e:
+                # connection dropped while streaming image
+                raise ImageError(f"Unable to download {image}: {e}")
+            return True
+
+        return await self._run("pull", _pull)
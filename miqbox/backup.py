@@ -0,0 +1,248 @@
+import os
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+
+from miqbox.configuration import Configuration
+from miqbox.exception import BackupError
+from miqbox.miqbox import MiqBox
+
+DATABASE = "vmdb_production"
+DATABASE_USER = "root"
+
+# key encrypting passwords in database; dump is useless on other appliance without it
+V2_KEY = "/var/www/miq/vmdb/certs/v2_key"
+
+# pg_restore needs a seekable file for parallel jobs
+UPLOAD_PATH = "/tmp/miqbox-restore.dump"
+
+EXTENSION = ".dump"
+
+
+class Backup(object):
+    """Stream appliance database to and from local artifact store
+
+    Dumps are custom format (`pg_dump -Fc`), compressed on appliance and written straight
+    from ssh channel to local file. Appliance `v2_key` is kept next to dump as
+    `<dump>.v2_key` and restored with it.
+
+    Args:
+        path (str): artifact store directory; default from configuration
+    """
+
+    def __init__(self, path=None):
+        self.path = path or Configuration().artifact_path
+
+    def artifacts(self):
+        """Dumps in artifact store; newest first"""
+        if not os.path.isdir(self.path):
+            return []
+        files = [f for f in os.listdir(self.path) if f.endswith(EXTENSION)]
+        return sorted(
+            files, key=lambda f: os.path.getmtime(os.path.join(self.path, f)), reverse=True
+        )
+
+    def artifact(self, name):
+        """Local path of dump given as path or name in artifact store
+
+        Raises:
+            BackupError: dump not found
+        """
+        for path in (
+            name,
+            os.path.join(self.path, name),
+            os.path.join(self.path, f"{name}{EXTENSION}"),
+        ):
+            if os.path.isfile(path):
+                return path
+        raise BackupError(f"Dump {name} not found")
+
+    @staticmethod
+    def _pg(app, command):
+        password = shlex.quote(app.db_password)
+        return f"PGPASSWORD={password} {command} -U {DATABASE_USER}"
+
+    @staticmethod
+    def _run(app, ssh, step, command):
+        out = ssh.run_command(command)
+        if out.rc != 0:
+            raise BackupError(f"{app.name}: {step} failed: {out.stderr.strip()}")
+        return out
+
+    def dump(self, app, output=None, compress=6):
+        """Dump appliance database into artifact store
+
+        Args:
+            app (Appliance): running appliance
+            output (str): local file; default `<appliance>-<timestamp>.dump` in artifact store
+            compress (int): pg_dump compression level 0-9
+
+        Returns:
+            str: local dump path
+
+        Raises:
+            BackupError: pg_dump or v2_key download failed
+        """
+        output = output or os.path.join(
+            self.path, f"{app.name}-{time.strftime('%Y%m%d-%H%M%S')}{EXTENSION}"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+        command = self._pg(app, f"pg_dump -Fc -Z {compress}") + f" {DATABASE}"
+        partial = f"{output}.part"
+        with open(partial, "wb") as f:
+            out = app.ssh_client.pipe_out(command, f)
+
+        if out.rc != 0:
+            os.remove(partial)
+            raise BackupError(f"{app.name}: pg_dump failed: {out.stderr.strip()}")
+
+        try:
+            with app.ssh_client.sftp as sftp:
+                sftp.get(V2_KEY, f"{output}.v2_key")
+        except OSError as e:
+            for file in (partial, f"{output}.v2_key"):
+                if os.path.exists(file):
+                    os.remove(file)
+            raise BackupError(f"{app.name}: v2_key download failed: {e}")
+        os.rename(partial, output)
+        return output
+
+    def restore(self, app, artifact, jobs=1):
+        """Restore database of appliance from dump
+
+        evmserverd is stopped while database is recreated and v2_key of dump replaced, and
+        started again afterwards. With one job dump is streamed into pg_restore stdin; more jobs
+        need dump uploaded to appliance first and removed after restore.
+
+        Args:
+            app (Appliance): running appliance
+            artifact (str): dump path or name in artifact store
+            jobs (int): parallel pg_restore jobs
+
+        Raises:
+            BackupError: v2_key of dump missing or restore failed
+        """
+        path = self.artifact(artifact)
+        key = f"{path}.v2_key"
+        if not os.path.isfile(key):
+            raise BackupError(f"v2_key of dump not found: {key}")
+
+        ssh = app.ssh_client
+        restore = self._pg(app, "pg_restore --no-owner") + f" -d {DATABASE}"
+
+        self._run(app, ssh, "stopping evmserverd", "systemctl stop evmserverd")
+        try:
+            with ssh.sftp as sftp:
+                sftp.put(key, V2_KEY)
+            self._run(app, ssh, "dropdb", self._pg(app, "dropdb --if-exists") + f" {DATABASE}")
+            self._run(app, ssh, "createdb", self._pg(app, "createdb") + f" {DATABASE}")
+
+            if jobs > 1:
+                with ssh.sftp as sftp:
+                    sftp.put(path, UPLOAD_PATH)
+                try:
+                    self._run(app, ssh, "pg_restore", f"{restore} -j {jobs} {UPLOAD_PATH}")
+                finally:
+                    ssh.run_command(f"rm -f {UPLOAD_PATH}")
+            else:
+                with open(path, "rb") as f:
+                    out = ssh.pipe_in(restore, f)
+                if out.rc != 0:
+                    raise BackupError(f"{app.name}: pg_restore failed: {out.stderr.strip()}")
+        except BaseException:
+            # best effort; error of restore is what caller needs to see
+            try:
+                ssh.run_command("systemctl start evmserverd")
+            except Exception:
+                pass
+            raise
+        self._run(app, ssh, "starting evmserverd", "systemctl start evmserverd")
+
+    def restore_all(self, apps, artifact, jobs=1, workers=None):
+        """Restore dump into many appliances at once
+
+        Args:
+            apps (list): running appliances
+            artifact (str): dump path or name in artifact store
+            jobs (int): parallel pg_restore jobs per appliance
+            workers (int): appliances restored at once; default all
+
+        Returns:
+            dict: appliance name: error message or None
+        """
+        path = self.artifact(artifact)
+
+        def _restore(app):
+            try:
+                self.restore(app, path, jobs=jobs)
+            except Exception as e:
+                return app.name, str(e)
+            return app.name, None
+
+        with ThreadPoolExecutor(max_workers=workers or len(apps)) as executor:
+            return dict(executor.map(_restore, apps))
+
+
+def _running(box, names_or_ids):
+    apps = [box.get_appliance(name, status="running") for name in names_or_ids]
+    if not apps or not all(apps):
+        click.echo("Please select proper Name or Id of running appliance")
+        exit(1)
+    return apps
+
+
+@click.command(name="db-dump", help="Dump Appliance Database")
+@click.argument("name_or_id")
+@click.option("-o", "--output", type=click.Path(), help="Dump file (default artifact store)")
+@click.option("-z", "--compress", default=6, type=click.IntRange(0, 9), help="Compression level")
+def db_dump(name_or_id, output, compress):
+    """Stream database of running appliance into local artifact store"""
+
+    app = _running(MiqBox(), [name_or_id])[0]
+    try:
+        path = Backup().dump(app, output=output, compress=compress)
+    except BackupError as e:
+        click.echo(click.style(str(e), fg="red"))
+        exit(1)
+    size = os.path.getsize(path) / (1024 * 1024)
+    click.echo(click.style(f"{app.name} database dumped to {path} ({size:.1f} MiB)", fg="green"))
+
+
+@click.command(name="db-restore", help="Restore Appliance Database")
+@click.argument("dump", required=False)
+@click.argument("names_or_ids", nargs=-1)
+@click.option(
+    "-j", "--jobs", default=1, help="Parallel pg_restore jobs (more upload dump to appliance)"
+)
+@click.option("-l", "--list", "list_", is_flag=True, help="List dumps in artifact store")
+def db_restore(dump, names_or_ids, jobs, list_):
+    """Restore dump into running appliances"""
+
+    backup = Backup()
+    if list_:
+        for artifact in backup.artifacts():
+            click.echo(artifact)
+        return
+
+    if not dump:
+        click.echo("Please provide dump to restore")
+        exit(1)
+
+    apps = _running(MiqBox(), names_or_ids)
+    try:
+        results = backup.restore_all(apps, dump, jobs=jobs)
+    except BackupError as e:
+        click.echo(click.style(str(e), fg="red"))
+        exit(1)
+
+    for name, error in results.items():
+        if error:
+            click.echo(click.style(f"{name}: {error}", fg="red"))
+        else:
+            click.echo(click.style(f"{name} database restored", fg="green"))
+
+    if any(results.values()):
+        exit(1)
@@ -2,6 +2,8 @@ import libvirt
 
 from miqbox.configuration import Configuration
 
+_connections = {}
+
 
 class Client(Configuration):
     """Libvirt client
@@ -16,8 +18,11 @@ class Client(Configuration):
 
     @property
     def driver(self):
-        """libvirt open connection"""
+        """libvirt open connection; shared per url while alive"""
+        conn = _connections.get(self.url)
         try:
-            return libvirt.open(self.url)
+            if conn is None or not conn.isAlive():
+                conn = _connections[self.url] = libvirt.open(self.url)
+            return conn
         except libvirt.libvirtError:
             print(f"Failed to open connection to {self.url}")
@@ -0,0 +1,145 @@
+import errno
+import fcntl
+import os
+
+from miqbox.throttle import Throttle
+
+# linux ioctl sharing extents of source with destination (btrfs, xfs reflink=1, ...)
+FICLONE = 0x40049409
+
+BUFFER_SIZE = 8 * 1024 * 1024
+
+# errors meaning method is not supported for these files; next method is tried
+UNSUPPORTED = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS}
+
+# filesystem (st_dev of destination directory) to first working method
+_methods = {}
+
+
+def segments(fd, size):
+    """Data regions of file; holes are skipped
+
+    Args:
+        fd (int): file descriptor
+        size (int): file size
+
+    Yields:
+        tuple: (offset, length)
+    """
+    offset = 0
+    while offset < size:
+        try:
+            start = os.lseek(fd, offset, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                # no data after offset
+                return
+            if e.errno in UNSUPPORTED and offset == 0:
+                yield 0, size
+                return
+            raise
+        end = min(os.lseek(fd, start, os.SEEK_HOLE), size)
+        yield start, end - start
+        offset = end
+
+
+def reflink(src, dst, size, progress, throttle):
+    """Share extents with source; instant and takes no space until written"""
+    fcntl.ioctl(dst, FICLONE, src)
+    progress(size)
+
+
+def copy_range(src, dst, size, progress, throttle):
+    """Copy data regions in kernel with copy_file_range"""
+    for offset, length in segments(src, size):
+        end = offset + length
+        while offset < end:
+            copied = os.copy_file_range(
+                src, dst, min(BUFFER_SIZE, end - offset), offset_src=offset, offset_dst=offset
+            )
+            if not copied:
+                break
+            offset += copied
+            progress(copied)
+            throttle(copied)
+    os.ftruncate(dst, size)
+
+
+def sparse(src, dst, size, progress, throttle):
+    """Copy data regions with large buffers; zero blocks become holes"""
+    zeros = bytes(BUFFER_SIZE)
+    for offset, length in segments(src, size):
+        end = offset + length
+        while offset < end:
+            chunk = os.pread(src, min(BUFFER_SIZE, end - offset), offset)
+            if not chunk:
+                break
+            if chunk != zeros[: len(chunk)]:
+                os.pwrite(dst, chunk, offset)
+            offset += len(chunk)
+            progress(len(chunk))
+            throttle(len(chunk))
+    os.ftruncate(dst, size)
+
+
+METHODS = {"reflink": reflink, "copy_file_range": copy_range, "sparse": sparse}
+
+if not hasattr(os, "copy_file_range"):
+    # python < 3.8
+    del METHODS["copy_file_range"]
+
+
+def clone(source, destination, rate=None, progress=None, method=None):
+    """Clone file with first method supported by filesystem
+
+    Methods are tried in order reflink, copy_file_range, sparse copy (cheapest first); the first
+    one working is remembered per destination filesystem. Forced methods are not remembered.
+
+    Args:
+        source (str): source file path
+        destination (str): destination file path
+        rate (int): bytes per second limit for copying methods
+        progress (callable): called with number of bytes done (holes included)
+        method (str): force method
+
+    Returns:
+        str: method used
+    """
+    done = [0]
+
+    def _progress(size):
+        done[0] += size
+        if progress:
+            progress(size)
+
+    device = os.stat(os.path.dirname(os.path.abspath(destination))).st_dev
+    methods = [method] if method else list(METHODS)
+
+    if not method and device in _methods:
+        methods.remove(_methods[device])
+        methods.insert(0, _methods[device])
+
+    size = os.path.getsize(source)
+    src = os.open(source, os.O_RDONLY)
+    try:
+        dst = os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            for name in methods:
+                try:
+                    METHODS[name](src, dst, size, _progress, Throttle(rate))
+                except OSError as e:
+                    if e.errno not in UNSUPPORTED or name == methods[-1]:
+                        raise
+                    os.ftruncate(dst, 0)
+                    done[0] = 0
+                    continue
+                # holes skipped count as done
+                if progress and size > done[0]:
+                    progress(size - done[0])
+                if not method:
+                    _methods[device] = name
+                return name
+        finally:
+            os.close(dst)
+    finally:
+        os.close(src)
@@ -6,6 +6,10 @@ import click
 from ruamel.yaml import safe_dump
 from ruamel.yaml import safe_load
 
+from miqbox.domain import Profile
+from miqbox.domain import PROFILES
+from miqbox.exception import ProfileError
+
 HOME = os.environ["HOME"]
 USER = os.environ["USER"]
 
@@ -59,11 +63,61 @@ class Configuration(object):
         Credentials = namedtuple("Credentials", ["username", "password"])
         return Credentials(self.data["appliance"]["username"], self.data["appliance"]["password"])
 
+    @property
+    def db_password(self):
+        """password of appliance database user set when configuring database"""
+        return self.data["appliance"].get("db_password") or "smartvm"
+
+    @property
+    def ssh_keys(self):
+        """public keys authorized on appliances by seed drive"""
+        return self.data["appliance"].get("ssh_keys") or []
+
+    @property
+    def profile(self):
+        """default appliance profile name"""
+        return self.data["appliance"].get("profile") or "default"
+
+    @property
+    def transport_type(self):
+        """appliance command transport: ssh, agent or auto (agent if responding else ssh)"""
+        return self.data["appliance"].get("transport") or "ssh"
+
+    @property
+    def save_image_format(self):
+        """managed save image format; None for hypervisor default"""
+        return self.data["appliance"].get("save_image_format")
+
+    @property
+    def profiles(self):
+        """built-in appliance profiles updated with profiles from configuration
+
+        Raises:
+            ProfileError: configured profile has unknown base
+        """
+
+        profiles = dict(PROFILES)
+        for name, data in (self.data.get("profiles") or {}).items():
+            base = profiles.get(data.get("base", "default"))
+            if base is None:
+                raise ProfileError(
+                    f"Profile '{name}' has unknown base '{data.get('base')}'; "
+                    f"select from: {', '.join(profiles)}"
+                )
+            fields = {key: value for key, value in data.items() if key in Profile._fields}
+            profiles[name] = base._replace(**fields)
+        return profiles
+
     @property
     def image_path(self):
         """image path in configuration."""
         return self.data.get("images").replace("~", HOME)
 
+    @property
+    def artifact_path(self):
+        """database dump store path in configuration"""
+        return (self.data.get("artifacts") or "~/.miqbox/artifacts").replace("~", HOME)
+
     @property
     def libvirt(self):
         """libvirt configuration data."""
@@ -76,6 +130,98 @@ class Configuration(object):
             data["storage_pool"]["path"].replace("~", HOME),
         )
 
+    @property
+    def admission(self):
+        """capacity admission configuration data"""
+
+        Admission = namedtuple("Admission", ["policy", "reserve_memory", "reserve_disk"])
+        data = self.data.get("admission") or {}
+        return Admission(
+            data.get("policy") or "reject",
+            data.get("reserve_memory", 2),
+            data.get("reserve_disk", 5),
+        )
+
+    @property
+    def aio(self):
+        """asyncio api configuration data"""
+
+        Aio = namedtuple("Aio", ["workers", "ssh_workers", "limits"])
+        data = self.data.get("aio") or {}
+        return Aio(data.get("workers", 16), data.get("ssh_workers", 32), data.get("limits") or {})
+
+    @property
+    def database(self):
+        """database volume configuration data"""
+
+        Database = namedtuple(
+            "Database", ["format", "preallocation", "cluster_size", "lazy_refcounts"]
+        )
+        data = self.data.get("database") or {}
+        return Database(
+            data.get("format") or "qcow2",
+            data.get("preallocation") or "off",
+            data.get("cluster_size"),
+            bool(data.get("lazy_refcounts")),
+        )
+
+    @property
+    def density(self):
+        """memory balloon controller configuration data"""
+
+        Density = namedtuple("Density", ["min_ratio", "free_target", "step", "interval"])
+        data = self.data.get("density") or {}
+        return Density(
+            data.get("min_ratio", 0.5),
+            data.get("free_target", 20),
+            data.get("step", 512),
+            data.get("interval", 10),
+        )
+
+    @property
+    def mirror(self):
+        """image mirror configuration data"""
+
+        Mirror = namedtuple("Mirror", ["path", "port", "rate", "interval", "select"])
+        data = self.data.get("mirror") or {}
+        return Mirror(
+            data.get("path", "~/.miqbox/mirror").replace("~", HOME),
+            data.get("port", 8080),
+            data.get("rate"),
+            data.get("interval", 3600),
+            data.get("select") or [],
+        )
+
+    @property
+    def qos(self):
+        """quality of service configuration data"""
+
+        QoS = namedtuple("QoS", ["cpu_shares", "io_weight", "iops", "bps"])
+        QoSConfig = namedtuple(
+            "QoSConfig", ["copy_rate", "download_rate", "provisioning", "serving"]
+        )
+        data = self.data.get("qos") or {}
+        fields = {field: None for field in QoS._fields}
+        return QoSConfig(
+            data.get("copy_rate"),
+            data.get("download_rate"),
+            QoS(**{**fields, **(data.get("provisioning") or {})}),
+            QoS(**{**fields, **(data.get("serving") or {})}),
+        )
+
+    @property
+    def reaper(self):
+        """idle reaper configuration data"""
+
+        Reaper = namedtuple("Reaper", ["window", "cpu", "net", "action"])
+        data = self.data.get("reaper") or {}
+        return Reaper(
+            data.get("window", 60),
+            data.get("cpu", 5.0),
+            data.get("net", 1.0),
+            data.get("action", "save"),
+        )
+
     @property
     def repositories(self):
         """repositories configuration data"""
@@ -100,8 +246,30 @@ def config(show):
             "Appliance:"
             f'\n\tUsername: {cfg["appliance"]["username"]}'
             f'\n\tPassword: {cfg["appliance"]["password"]}'
+            f"\n\tDatabase password: {conf.db_password}"
+            f"\n\tProfile: {conf.profile}"
+            f"\n\tSave image format: {conf.save_image_format or 'default'}"
+            f"\n\tTransport: {conf.transport_type}"
         )
         click.echo(f'Image storage location: {cfg["images"]}')
+        click.echo(f"Database dump location: {conf.artifact_path}")
+        click.echo(
+            f"Density:\n\tMinimum memory ratio: {conf.density.min_ratio}"
+            f"\n\tFree target (%): {conf.density.free_target}"
+            f"\n\tStep (MiB): {conf.density.step}"
+            f"\n\tInterval (s): {conf.density.interval}"
+        )
+        click.echo(
+            f"Admission:\n\tPolicy: {conf.admission.policy}"
+            f"\n\tReserved memory (GiB): {conf.admission.reserve_memory}"
+            f"\n\tReserved disk (GiB): {conf.admission.reserve_disk}"
+        )
+        click.echo(
+            f"Database volume:\n\tFormat: {conf.database.format}"
+            f"\n\tPreallocation: {conf.database.preallocation}"
+            f"\n\tCluster size (KiB): {conf.database.cluster_size or 'default'}"
+            f"\n\tLazy refcounts: {conf.database.lazy_refcounts}"
+        )
         click.echo(
             f'Libvirt:\n\tDriver location: {cfg["libvirt"]["driver"]}\n\tStorage pool:'
             f'\n\t\tName: {cfg["libvirt"]["storage_pool"]["name"]}'
@@ -128,6 +296,13 @@ def config(show):
             "Storage Pool Path", default=conf.libvirt.pool_path
         )
         cfg["images"] = click.prompt("Local Image Location", default=conf.image_path)
+        try:
+            profiles = conf.profiles
+        except ProfileError as e:
+            raise click.ClickException(str(e))
+        cfg["appliance"]["profile"] = click.prompt(
+            "Appliance Profile", default=conf.profile, type=click.Choice(list(profiles.keys()))
+        )
         cfg["repositories"]["upstream"]["url"] = click.prompt(
             "Upstream Repository", default=conf.repositories.get("upstream").url
         )
@@ -0,0 +1,216 @@
+import json
+import os
+import socketserver
+import threading
+
+import click
+import libvirt
+
+from miqbox.exception import ApplianceNotFoundError
+from miqbox.exception import MiqBoxException
+from miqbox.images import Images
+from miqbox.miqbox import MiqBox
+from miqbox.resolver import resolver
+from miqbox.rpc import socket_path
+from miqbox.ssh import SSH
+
+
+class Service(object):
+    """Operations served by miqboxd
+
+    Used in-process by the cli when miqboxd is not running. Results are plain json types.
+    """
+
+    exposed = (
+        "status",
+        "start",
+        "stop",
+        "kill",
+        "exec",
+        "restart_evmserverd",
+        "images",
+        "overcommit",
+    )
+
+    def __init__(self):
+        self.box = MiqBox()
+        self._ssh = {}
+        self._connecting = {}
+        self._lock = threading.Lock()
+
+    def appliance(self, name, status=None):
+        """Get appliance by name or id
+
+        Raises:
+            ApplianceNotFoundError: appliance not found
+        """
+        app = self.box.get_appliance(name, status=status)
+        if not app:
+            raise ApplianceNotFoundError(f"Appliance {name} not found")
+        return app
+
+    def transport(self, app):
+        """Guest agent if enabled in configuration and answering; else cached ssh session"""
+        return app.agent or self.ssh(app)
+
+    def ssh(self, app):
+        """Cached ssh session of appliance
+
+        Connecting holds lock of that appliance only; requests for other appliances go on.
+        """
+        key = (app.app.name(), app.hostname)
+        with self._lock:
+            connecting = self._connecting.setdefault(key, threading.Lock())
+
+        with connecting:
+            session = self._ssh.get(key)
+            if session is None or not session.is_active:
+                session = SSH(
+                    hostname=app.hostname,
+                    username=app.creds.username,
+                    password=app.creds.password,
+                )
+                with self._lock:
+                    self._ssh[key] = session
+        return session
+
+    def forget(self, conn, domain, *args):
+        """Drop ssh sessions of domain; lifecycle event callback"""
+        with self._lock:
+            for key in [key for key in self._ssh if key[0] == domain.name()]:
+                del self._ssh[key]
+
+    def status(self, status=None):
+        """Information of appliances as per status"""
+        return [app.info() for app in self.box.appliances(status=status).values()]
+
+    def start(self, name, fresh=False):
+        """Start stopped or paused appliance
+
+        Returns:
+            str: message for user; empty if appliance booted cold
+
+        Raises:
+            ApplianceNotFoundError: no stopped or paused appliance with name
+        """
+        app = self.box.get_appliance(name, status="shut off") or self.box.get_appliance(
+            name, status="paused"
+        )
+        if not app:
+            raise ApplianceNotFoundError(f"Appliance {name} not found")
+
+        resumed = app.is_saved and not fresh
+        app.start(fresh=fresh)
+        return f"{app.name} resumed from saved state" if resumed else ""
+
+    def stop(self, name, save=False):
+        return self.appliance(name, status="running").stop(save=save)
+
+    def kill(self, name):
+        """Remove appliance
+
+        Returns:
+            list: removed disk names
+
+        Raises:
+            MiqBoxException: appliance did not shut down
+        """
+        removed = self.appliance(name).kill()
+        if removed is False:
+            raise MiqBoxException(f"Fail to shutdown appliance {name}")
+        return removed
+
+    def exec(self, name, command):
+        """Run command on running appliance
+
+        Returns:
+            dict: rc, stdout, stderr
+        """
+        app = self.appliance(name, status="running")
+        return self.transport(app).run_command(command)._asdict()
+
+    def restart_evmserverd(self, name):
+        app = self.appliance(name, status="running")
+        return self.transport(app).run_command("systemctl restart evmserverd").rc == 0
+
+    def images(self, stream, version, local=False):
+        return Images(stream=stream, version=version).images(local=local)
+
+    def overcommit(self):
+        """Memory overcommit of running appliances
+
+        Returns:
+            dict: host, committed, ballooned, shared, ratio, effective
+        """
+        return self.box.overcommit()._asdict()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Handle json line requests: {"method": ..., "args": [...], "kwargs": {...}}"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                method = request["method"]
+                if method not in Service.exposed:
+                    raise MiqBoxException(f"Method {method} not exposed")
+                result = getattr(self.server.service, method)(
+                    *request.get("args", []), **request.get("kwargs", {})
+                )
+                response = {"result": result}
+            except MiqBoxException as e:
+                response = {"error": str(e), "type": type(e).__name__}
+            except Exception as e:
+                response = {"error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, service):
+        self.service = service
+        super(Server, self).__init__(path, RequestHandler)
+
+
+def _run_events():
+    while True:
+        libvirt.virEventRunDefaultImpl()
+
+
+@click.command(help="MiqBox daemon")
+@click.option("-s", "--socket", "path", default=None, help="Unix socket path")
+def main(path):
+    """Serve miqbox operations over unix socket with warm connections and caches"""
+
+    path = path or socket_path()
+
+    # event loop must be registered before any libvirt connection is opened
+    libvirt.virEventRegisterDefaultImpl()
+    threading.Thread(target=_run_events, name="libvirt-events", daemon=True).start()
+
+    service = Service()
+    resolver(service.box.url).watch()
+    service.box.driver.domainEventRegisterAny(
+        None, libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE, service.forget, None
+    )
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+
+    server = Server(path, service)
+    os.chmod(path, 0o600)
+    click.echo(f"miqboxd listening on {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
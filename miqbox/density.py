@@ -0,0 +1,116 @@
+import time
+
+import click
+import libvirt
+
+from miqbox.miqbox import MiqBox
+
+
+class Balloon(MiqBox):
+    """Adjust balloon targets of appliances from guest reported memory
+
+    Only appliances reporting guest memory stats (profiles with `balloon` period, e.g. `dense`)
+    are managed. Each gets what its guest uses plus free target, between `min_ratio` of and
+    its configured memory. Targets grow at once and shrink by at most `step` per adjustment.
+
+    Args:
+        min_ratio (float): lowest target as fraction of configured memory
+        free_target (int): percent of target kept free in guest
+        step (int): MiB appliance may shrink per adjustment
+    """
+
+    def __init__(self, min_ratio=None, free_target=None, step=None, *args, **kwargs):
+        super(Balloon, self).__init__(*args, **kwargs)
+        conf = self.density
+        self.min_ratio = conf.min_ratio if min_ratio is None else min_ratio
+        self.free_target = conf.free_target if free_target is None else free_target
+        self.step = step or conf.step
+
+    def targets(self):
+        """Balloon targets of managed appliances
+
+        Returns:
+            dict: name: (domain, current KiB, target KiB)
+        """
+        stats = self.driver.getAllDomainStats(
+            libvirt.VIR_DOMAIN_STATS_BALLOON, libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_RUNNING
+        )
+        targets = {}
+
+        for domain, data in stats:
+            # guest stats only reported with stats period set and balloon driver loaded
+            free = data.get("balloon.usable", data.get("balloon.unused"))
+            if free is None or "balloon.available" not in data:
+                continue
+
+            current = data["balloon.current"]
+            maximum = data["balloon.maximum"]
+            used = max(data["balloon.available"] - free, 0)
+
+            target = used * 100 / (100 - self.free_target)
+            target = min(max(target, maximum * self.min_ratio), maximum)
+            target = max(target, current - self.step * 1024)
+            targets[domain.name()] = (domain, current, int(target))
+        return targets
+
+    def adjust(self, dry_run=False):
+        """Set balloon targets of managed appliances
+
+        Changes below a quarter of step are skipped to avoid churn.
+
+        Args:
+            dry_run (bool): only report changes
+
+        Returns:
+            dict: name: (current KiB, target KiB) of changed appliances
+        """
+        changes = {}
+        for name, (domain, current, target) in self.targets().items():
+            if abs(target - current) < self.step * 1024 / 4:
+                continue
+            if not dry_run:
+                domain.setMemory(target)
+            changes[name] = (current, target)
+        return changes
+
+
+@click.command(help="Balloon Appliance Memory")
+@click.option("--min_ratio", type=float, help="Lowest memory as fraction of configured memory")
+@click.option("--free_target", type=int, help="Percent of memory kept free in guest")
+@click.option("--step", type=int, help="MiB appliance may shrink per adjustment")
+@click.option("--dry_run", is_flag=True, help="Only report changes")
+@click.option("-d", "--daemon", is_flag=True, help="Keep adjusting every interval")
+@click.option("-i", "--interval", type=int, help="Daemon interval in seconds")
+def balloon(min_ratio, free_target, step, dry_run, daemon, interval):
+    """Adjust memory of density appliances from guest free memory"""
+
+    controller = Balloon(min_ratio=min_ratio, free_target=free_target, step=step)
+    interval = interval or controller.density.interval
+
+    if not controller.ksm().get("run"):
+        click.echo(
+            click.style(
+                "KSM is not running; identical appliance pages are not shared "
+                "(enable with ksmtuned or `echo 1 > /sys/kernel/mm/ksm/run`)",
+                fg="yellow",
+            )
+        )
+
+    while True:
+        changes = controller.adjust(dry_run=dry_run)
+        entities = "{:<28s}{:>14s}{:>14s}"
+
+        for index, (name, (current, target)) in enumerate(changes.items()):
+            if not index:
+                click.echo(entities.format("Name", "Current MiB", "Target MiB"))
+            click.echo(entities.format(name, str(current // 1024), str(target // 1024)))
+
+        if not daemon:
+            usage = controller.overcommit()
+            click.echo(
+                f"{len(changes)} appliance(s) adjusted; "
+                f"overcommit {usage.ratio:.2f}x of host memory, "
+                f"{usage.effective:.2f}x of memory backing appliances"
+            )
+            break
+        time.sleep(interval)
@@ -0,0 +1,168 @@
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+from miqbox.miq_xmls import APPLIANCE
+from miqbox.miq_xmls import BLKIOTUNE
+from miqbox.miq_xmls import CONSOLE
+from miqbox.miq_xmls import CPU_MODEL
+from miqbox.miq_xmls import CPUTUNE
+from miqbox.miq_xmls import GRAPHICS
+from miqbox.miq_xmls import GUEST_AGENT
+from miqbox.miq_xmls import HUGEPAGES
+from miqbox.miq_xmls import IOTHREADS
+from miqbox.miq_xmls import IOTUNE
+from miqbox.miq_xmls import IOTUNE_ENTRY
+from miqbox.miq_xmls import LABEL
+from miqbox.miq_xmls import MEMBALLOON
+from miqbox.miq_xmls import METADATA
+from miqbox.miq_xmls import METADATA_URI
+from miqbox.miq_xmls import NUMATUNE
+from miqbox.miq_xmls import SEED
+from miqbox.miq_xmls import SHARES
+from miqbox.miq_xmls import VCPUPIN
+
+# balloon: guest memory stats period in seconds for balloon controller; 0 disables
+Profile = namedtuple(
+    "Profile",
+    [
+        "cpu_mode",
+        "disk_cache",
+        "disk_io",
+        "iothreads",
+        "hugepages",
+        "pinning",
+        "graphics",
+        "balloon",
+    ],
+)
+
+PROFILES = {
+    "default": Profile(None, None, None, 0, False, False, True, 0),
+    "fast-io": Profile("host-passthrough", "none", "native", 2, False, False, True, 0),
+    "dense": Profile("host-passthrough", "none", "native", 0, False, False, False, 5),
+    "headless": Profile(None, None, None, 0, False, False, False, 0),
+    "pinned": Profile("host-passthrough", "none", "native", 2, True, True, False, 0),
+}
+
+
+def host_cells(capabilities):
+    """Map host cpus to NUMA cells
+
+    Args:
+        capabilities (str): libvirt host capabilities xml
+
+    Returns:
+        dict: cpu id: cell id
+    """
+    cells = {}
+    for cell in ET.fromstring(capabilities).findall("host/topology/cells/cell"):
+        for cpu in cell.findall("cpus/cpu"):
+            cells[int(cpu.get("id"))] = int(cell.get("id"))
+    return cells
+
+
+def disk_driver(profile, iothread=None):
+    """Extra disk driver attributes as per profile"""
+    attrs = ""
+    if profile.disk_cache:
+        attrs += f' cache="{profile.disk_cache}"'
+    if profile.disk_io:
+        attrs += f' io="{profile.disk_io}"'
+    if iothread:
+        attrs += f' iothread="{iothread}"'
+    return attrs
+
+
+def iotune(qos):
+    """Disk iotune element as per qos limits"""
+    entries = []
+    if qos and qos.bps:
+        entries.append(IOTUNE_ENTRY.format(name="total_bytes_sec", value=qos.bps))
+    if qos and qos.iops:
+        entries.append(IOTUNE_ENTRY.format(name="total_iops_sec", value=qos.iops))
+    return _block([IOTUNE.format(entries="\n".join(entries))] if entries else [])
+
+
+def metadata(labels):
+    """Domain metadata element holding miqbox labels"""
+    if not labels:
+        return ""
+    entries = "".join(LABEL.format(name=name, value=value) for name, value in labels.items())
+    return _block([METADATA.format(uri=METADATA_URI, labels=entries)])
+
+
+def _block(fragments):
+    return "".join(f"\n{fragment}" for fragment in fragments)
+
+
+def appliance_xml(
+    profile=None, cpuset=None, cells=None, seed=None, qos=None, agent=False, labels=None, **kwargs
+):
+    """Render appliance domain xml as per profile
+
+    Args:
+        profile (Profile): performance profile; `default` if not provided
+        cpuset (list): host cpus to pin vcpus on (used by pinning profiles)
+        cells (dict): host cpu to NUMA cell map (used by pinning profiles)
+        seed (str): path of first boot seed iso to attach
+        qos (namedtuple): cpu shares, io weight and disk limits (cpu_shares, io_weight, iops,
+            bps)
+        agent (bool): add qemu guest agent channel
+        labels (dict): labels stored in domain metadata
+        kwargs: `APPLIANCE` template fields
+
+    Returns:
+        str: domain xml
+    """
+    profile = profile or PROFILES["default"]
+    tuning = []
+    devices = []
+
+    if profile.iothreads:
+        tuning.append(IOTHREADS.format(count=profile.iothreads))
+
+    cputune = []
+    if qos and qos.cpu_shares:
+        cputune.append(SHARES.format(shares=qos.cpu_shares))
+
+    if profile.pinning and cpuset:
+        cputune.extend(
+            VCPUPIN.format(vcpu=vcpu, cpuset=cpuset[vcpu % len(cpuset)])
+            for vcpu in range(int(kwargs["cpu"]))
+        )
+
+    if cputune:
+        tuning.append(CPUTUNE.format(entries="\n".join(cputune)))
+
+    if qos and qos.io_weight:
+        tuning.append(BLKIOTUNE.format(weight=qos.io_weight))
+
+    if profile.pinning and cpuset:
+        nodes = sorted({cells[cpu] for cpu in cpuset if cpu in cells}) if cells else []
+        if nodes:
+            tuning.append(NUMATUNE.format(nodeset=",".join(str(node) for node in nodes)))
+
+    if profile.hugepages:
+        tuning.append(HUGEPAGES)
+
+    devices.append(GRAPHICS if profile.graphics else CONSOLE)
+    if agent:
+        devices.append(GUEST_AGENT)
+
+    # hugepages can not be ballooned or merged by KSM
+    if profile.balloon and not profile.hugepages:
+        devices.append(MEMBALLOON.format(period=profile.balloon))
+
+    if seed:
+        devices.append(SEED.format(path=seed))
+
+    return APPLIANCE.format(
+        tuning=_block(tuning),
+        cpu_model=_block([CPU_MODEL.format(mode=profile.cpu_mode)] if profile.cpu_mode else []),
+        base_driver=disk_driver(profile, iothread=1 if profile.iothreads else None),
+        db_driver=disk_driver(profile, iothread=min(2, profile.iothreads) or None),
+        devices=_block(devices),
+        iotune=iotune(qos),
+        metadata=metadata(labels),
+        **kwargs,
+    )
@@ -8,3 +8,69 @@ class DBConfigError(MiqBoxException):
     """Error in db configuration"""
 
     pass
+
+
+class SeedError(MiqBoxException):
+    """Error in seed drive creation"""
+
+    pass
+
+
+class ApplianceNotFoundError(MiqBoxException):
+    """Appliance not found by name or id"""
+
+    pass
+
+
+class DaemonError(MiqBoxException):
+    """Error returned by miqboxd"""
+
+    pass
+
+
+class ProfileError(MiqBoxException):
+    """Error in appliance profile configuration"""
+
+    pass
+
+
+class ProvisionError(MiqBoxException):
+    """Error in appliance provisioning"""
+
+    pass
+
+
+class SnapshotError(MiqBoxException):
+    """Error in appliance snapshot"""
+
+    pass
+
+
+class BackupError(MiqBoxException):
+    """Error in appliance database backup or restore"""
+
+    pass
+
+
+class FleetError(MiqBoxException):
+    """Error in fleet manifest or apply"""
+
+    pass
+
+
+class SSHError(MiqBoxException):
+    """Error in ssh connection to appliance"""
+
+    pass
+
+
+class AgentError(MiqBoxException):
+    """Error in guest agent command"""
+
+    pass
+
+
+class ImageError(MiqBoxException):
+    """Error in image listing or download"""
+
+    pass
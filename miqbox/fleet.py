@@ -0,0 +1,371 @@
+import os
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+import click
+from ruamel.yaml import safe_load
+
+from miqbox.exception import FleetError
+from miqbox.exception import ProfileError
+from miqbox.miqbox import Appliance
+from miqbox.miqbox import MiqBox
+
+# labels marking appliances managed by a manifest
+FLEET = "fleet"
+GROUP = "fleet-group"
+
+# settings fixed at creation; changing them recreates appliance
+IMMUTABLE = ("image", "db_size", "profile")
+
+Spec = namedtuple(
+    "Spec",
+    [
+        "name",
+        "group",
+        "image",
+        "cpu",
+        "memory",
+        "db_size",
+        "profile",
+        "seed",
+        "configure",
+        "depends_on",
+    ],
+)
+
+# kind: create, recreate, resize, start or remove; changes: (setting, current, desired)
+Action = namedtuple("Action", ["kind", "name", "group", "spec", "changes", "after"])
+
+SYMBOLS = {"create": "+", "recreate": "±", "resize": "~", "start": ">", "remove": "-"}
+
+
+class Fleet(MiqBox):
+    """Appliances declared in manifest
+
+    Manifest::
+
+        fleet: lab
+        appliances:
+          - name: db
+            image: cfme-rhevm-5.11.0.0-1.x86_64.qcow2
+            cpu: 4
+            memory: 8
+            db_size: 10
+            configure: true
+          - name: worker
+            image: cfme-rhevm-5.11.0.0-1.x86_64.qcow2
+            count: 3
+            depends_on: [db]
+
+    Appliances are named `<fleet>-<name>-<index>` and labelled with fleet and group name.
+
+    Args:
+        manifest (dict): manifest data
+    """
+
+    def __init__(self, manifest, *args, **kwargs):
+        super(Fleet, self).__init__(*args, **kwargs)
+        self.manifest = manifest or {}
+        self.name = self.manifest.get("fleet")
+
+        if not self.name:
+            raise FleetError("Manifest needs fleet name")
+
+    @classmethod
+    def load(cls, path):
+        """Fleet from manifest file"""
+        with open(path, "r") as f:
+            return cls(safe_load(f))
+
+    @property
+    def desired(self):
+        """Appliances declared in manifest
+
+        Returns:
+            dict: name: Spec
+
+        Raises:
+            FleetError: invalid manifest
+        """
+        specs = {}
+        groups = {}
+        for data in self.manifest.get("appliances") or []:
+            if not data.get("name") or not data.get("image"):
+                raise FleetError("Appliances need name and image")
+            if data["name"] in groups:
+                raise FleetError(f"{data['name']}: declared more than once")
+            groups[data["name"]] = data
+        images = os.listdir(self.image_path)
+
+        for group, data in groups.items():
+            if data["image"] not in images:
+                raise FleetError(f"{group}: image '{data['image']}' not available")
+
+            profile = data.get("profile") or self.profile
+            if profile not in self.profiles:
+                raise FleetError(f"{group}: profile '{profile}' not available")
+
+            depends_on = list(data.get("depends_on") or [])
+            unknown = set(depends_on) - set(groups)
+            if unknown:
+                raise FleetError(f"{group}: unknown dependencies {', '.join(sorted(unknown))}")
+
+            try:
+                count = int(data.get("count", 1))
+            except (TypeError, ValueError):
+                count = 0
+            if count < 1:
+                raise FleetError(f"{group}: count must be a positive integer")
+
+            for index in range(count):
+                name = f"{self.name}-{group}-{index}"
+                specs[name] = Spec(
+                    name=name,
+                    group=group,
+                    image=data["image"],
+                    cpu=int(data.get("cpu", 1)),
+                    memory=int(data.get("memory", 4)),
+                    db_size=int(data.get("db_size", 5)),
+                    profile=profile,
+                    seed=bool(data.get("seed", False)),
+                    configure=bool(data.get("configure", False)),
+                    depends_on=depends_on,
+                )
+
+        self._check_cycles({group: data.get("depends_on") or [] for group, data in groups.items()})
+        return specs
+
+    @staticmethod
+    def _check_cycles(graph):
+        done = set()
+
+        def _visit(group, path):
+            if group in path:
+                raise FleetError(f"Dependency cycle: {' -> '.join(path + [group])}")
+            if group in done:
+                return
+            for dependency in graph[group]:
+                _visit(dependency, path + [group])
+            done.add(group)
+
+        for group in graph:
+            _visit(group, [])
+
+    @property
+    def current(self):
+        """Appliances of fleet in libvirt
+
+        Returns:
+            dict: name: Appliance
+        """
+        current = {}
+        for name, app in self.appliances().items():
+            if app.labels.get(FLEET) == self.name:
+                current[name] = app
+        return current
+
+    def plan(self):
+        """Actions bringing libvirt state to manifest
+
+        Returns:
+            list: Action
+        """
+        desired = self.desired
+        current = self.current
+        actions = []
+
+        for name, spec in desired.items():
+            after = set(spec.depends_on)
+            app = current.get(name)
+
+            if app is None:
+                actions.append(Action("create", name, spec.group, spec, [], after))
+                continue
+
+            labels = app.labels
+            changes = [
+                (key, labels.get(f"{FLEET}-{key}"), str(getattr(spec, key)))
+                for key in IMMUTABLE
+                if labels.get(f"{FLEET}-{key}") != str(getattr(spec, key))
+            ]
+            if changes:
+                actions.append(Action("recreate", name, spec.group, spec, changes, after))
+                continue
+
+            changes = [
+                (key, getattr(app, key), getattr(spec, key))
+                for key in ("cpu", "memory")
+                if getattr(app, key) != getattr(spec, key)
+            ]
+            if changes:
+                actions.append(Action("resize", name, spec.group, spec, changes, after))
+            elif not app.is_active:
+                actions.append(Action("start", name, spec.group, spec, [], after))
+
+        for name in current:
+            if name not in desired:
+                actions.append(Action("remove", name, None, None, [], set()))
+        return actions
+
+    def labels(self, spec):
+        """Labels of fleet appliance; set at definition so failed applies stay in fleet"""
+        labels = {FLEET: self.name, GROUP: spec.group}
+        labels.update({f"{FLEET}-{key}": str(getattr(spec, key)) for key in IMMUTABLE})
+        return labels
+
+    def _create(self, spec):
+        app = self.provision(
+            name=spec.name,
+            image=spec.image,
+            cpu=spec.cpu,
+            memory=spec.memory,
+            db_size=spec.db_size,
+            profile=spec.profile,
+            seed=spec.seed,
+            configure=spec.configure,
+            ssh_keys=self.ssh_keys,
+            progress=False,
+            labels=self.labels(spec),
+        )
+
+        if not app.wait_for_hostname(timeout=300):
+            raise FleetError(f"Unable to get hostname for {spec.name}")
+        if spec.configure:
+            if not spec.seed:
+                app.configure()
+            app.wait_for_ui(timeout=900)
+        app.set_qos(self.qos.serving)
+
+    def run(self, action):
+        """Run single action
+
+        Returns:
+            str: outcome
+        """
+        if action.kind == "create":
+            self._create(action.spec)
+            return "created"
+        app = Appliance(name=action.name)
+
+        if action.kind == "recreate":
+            app.kill()
+            self._create(action.spec)
+            return "recreated"
+        elif action.kind == "resize":
+            if app.resize(cpu=action.spec.cpu, memory=action.spec.memory):
+                return "resized"
+            elif app.is_active:
+                return "resized; restart to apply"
+            app.start()
+            return "resized and started"
+        elif action.kind == "start":
+            app.start()
+            return "started"
+        elif action.kind == "remove":
+            app.kill()
+            return "removed"
+        raise FleetError(f"Unknown action {action.kind}")
+
+    def apply(self, actions, workers=4, callback=None):
+        """Run actions in parallel
+
+        Actions of a group wait for all actions of groups it depends on; actions depending on a
+        failed group are skipped.
+
+        Args:
+            actions (list): Action from `plan`
+            workers (int): actions run at once
+            callback (callable): called with action and outcome or error as each finishes
+
+        Returns:
+            dict: appliance name: (ok, outcome or error)
+        """
+        pending = list(actions)
+        remaining = {}
+        for action in actions:
+            remaining[action.group] = remaining.get(action.group, 0) + 1
+
+        failed = set()
+        running = {}
+        results = {}
+
+        def _finish(action, ok, outcome):
+            results[action.name] = (ok, outcome)
+            remaining[action.group] -= 1
+            if not ok:
+                failed.add(action.group)
+            if callback:
+                callback(action, ok, outcome)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while pending or running:
+                for action in list(pending):
+                    if action.after & failed:
+                        pending.remove(action)
+                        _finish(action, False, "skipped; dependency failed")
+                    elif not any(remaining.get(group) for group in action.after):
+                        pending.remove(action)
+                        running[executor.submit(self.run, action)] = action
+
+                if not running:
+                    # nothing runnable left
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    action = running.pop(future)
+                    error = future.exception()
+                    _finish(action, error is None, str(error) if error else future.result())
+        return results
+
+
+def _describe(action):
+    if action.kind in ("create", "recreate"):
+        spec = action.spec
+        details = [f"{spec.image}, {spec.cpu} cpu, {spec.memory} GiB, db {spec.db_size} GiB"]
+        details += [f"{key} {old} -> {new}" for key, old, new in action.changes]
+        return "; ".join(details)
+    return ", ".join(f"{key} {old} -> {new}" for key, old, new in action.changes)
+
+
+@click.command(help="Apply Fleet Manifest")
+@click.option("-f", "--file", "path", required=True, type=click.Path(exists=True))
+@click.option("--dry_run", is_flag=True, help="Show plan without applying it")
+@click.option("-j", "--jobs", default=4, help="Actions run in parallel")
+def apply(path, dry_run, jobs):
+    """Create, resize or remove appliances until libvirt matches manifest"""
+
+    try:
+        fleet = Fleet.load(path)
+        actions = fleet.plan()
+    except (FleetError, ProfileError) as e:
+        click.echo(click.style(str(e), fg="red"))
+        exit(1)
+
+    if not actions:
+        click.echo(f"Fleet {fleet.name} is up to date")
+        return
+
+    counts = {}
+    for action in actions:
+        counts[action.kind] = counts.get(action.kind, 0) + 1
+    click.echo(
+        f"Plan for fleet {fleet.name}: "
+        + ", ".join(f"{count} to {kind}" for kind, count in counts.items())
+    )
+    width = max(len(action.name) for action in actions)
+    for action in actions:
+        symbol = SYMBOLS[action.kind]
+        click.echo(f"  {symbol} {action.name:<{width}}  {action.kind:<8}  {_describe(action)}")
+
+    if dry_run:
+        return
+
+    def _report(action, ok, outcome):
+        click.echo(click.style(f"{action.name}: {outcome}", fg="green" if ok else "red"))
+
+    results = fleet.apply(actions, workers=jobs, callback=_report)
+    if not all(ok for ok, _ in results.values()):
+        exit(1)
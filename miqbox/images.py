@@ -1,11 +1,114 @@
+import io
 import os
+import re
 import socket
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 import click
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 
 from miqbox.configuration import Configuration
+from miqbox.throttle import Throttle
+
+CHUNK_SIZE = 1024 * 1024
+
+RemoteImage = namedtuple("RemoteImage", ["name", "stream", "version", "size", "date"])
+
+# index page columns (apache and nginx autoindex)
+DATE = re.compile(r"(\d{1,2}-\w{3}-\d{4}|\d{4}-\d{2}-\d{2}) (\d{2}:\d{2}(?::\d{2})?)")
+SIZE = re.compile(r"^(\d+(?:\.\d+)?)\s*([KMGT])?i?B?$", re.IGNORECASE)
+DATE_FORMATS = ("%d-%b-%Y %H:%M", "%d-%b-%Y %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S")
+UNITS = ("K", "M", "G", "T")
+
+_session = None
+
+
+def session():
+    """Shared http session; connections are pooled and kept alive across requests"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def parse_columns(text):
+    """Size and date following image link on index page
+
+    Args:
+        text (str): text of index row after link
+
+    Returns:
+        tuple: (size in bytes or None, datetime or None)
+    """
+    size = date = None
+    match = DATE.search(text)
+    if match:
+        for fmt in DATE_FORMATS:
+            try:
+                date = datetime.strptime(" ".join(match.groups()), fmt)
+                break
+            except ValueError:
+                continue
+        text = text[match.end() :]
+
+    for token in text.split():
+        found = SIZE.match(token)
+        if found:
+            unit = (found.group(2) or "").upper()
+            power = UNITS.index(unit) + 1 if unit else 0
+            size = int(float(found.group(1)) * 1024 ** power)
+            break
+    return size, date
+
+
+def human_size(size):
+    """Size in bytes as short human readable text"""
+    if size is None:
+        return "-"
+    for unit in ("",) + UNITS:
+        if size < 1024 or unit == UNITS[-1]:
+            return f"{size:.1f}{unit}" if unit else f"{size}"
+        size /= 1024
+
+
+def image_version(name):
+    """Version field of image name (`<stream>-<provider>-<version>-...`); None if not present"""
+    fields = name.split("-")
+    return fields[2] if len(fields) > 2 else None
+
+
+def version_key(name, versions=()):
+    """Sort key ordering images by release series then build numbers
+
+    Numbers compare numerically (5.11.0.10 after 5.11.0.9); series unknown to `versions`
+    sort first.
+
+    Args:
+        name (str): image name
+        versions (list): release series oldest first (upstream code names, downstream x.y)
+
+    Returns:
+        tuple
+    """
+    version = image_version(name) or ""
+    rank = -1
+    for index, series in enumerate(versions):
+        if version == series or version.startswith(f"{series}."):
+            rank = index
+    build = "-".join(name.split("-")[2:])
+    natural = tuple(
+        (0, int(part)) if part.isdigit() else (1, part)
+        for part in re.split(r"(\d+)", build)
+        if part
+    )
+    return rank, natural
 
 
 class Images(Configuration):
@@ -39,6 +142,41 @@ class Images(Configuration):
             repo = f"{repo}/builds/cfme/{base_version}/stable"
         return repo
 
+    def matches(self, name):
+        """Check image belongs to version (5.1 does not match 5.10 builds)"""
+        version = image_version(name)
+        return bool(version) and (version == self.version or version.startswith(f"{self.version}."))
+
+    def listing(self):
+        """Remote images of stream and version with size and date from index page
+
+        Returns:
+            list: RemoteImage
+
+        Raises:
+            requests.exceptions.RequestException: index page not available
+        """
+        response = session().get(self.repo_link, verify=self.ssl_verify, timeout=30)
+        response.raise_for_status()
+        soup = BeautifulSoup(response.text, "html.parser")
+        imgs = []
+
+        for node in soup.find_all("a"):
+            name = node.get("href")
+            if not (name and name.endswith(self.extension) and self.matches(name)):
+                continue
+
+            row = node.find_parent("tr")
+            if row:
+                text = " ".join(cell.get_text(" ") for cell in row.find_all("td"))
+                text = text[text.find(node.get_text()) + len(node.get_text()) :]
+            else:
+                text = str(node.next_sibling or "")
+
+            size, date = parse_columns(text)
+            imgs.append(RemoteImage(name, self.stream, self.version, size, date))
+        return imgs
+
     def images(self, local=False):
         """Get all available images as per stream and version
 
@@ -52,34 +190,35 @@ class Images(Configuration):
 
         if local:
             for img in os.listdir(self.image_path):
-                if self.stream == "upstream" and "manageiq" in img and self.version in img:
+                if self.stream == "upstream" and "manageiq" in img and self.matches(img):
                     imgs.append(img)
-                elif self.stream == "downstream" and self.version in img:
+                elif self.stream == "downstream" and self.matches(img):
                     imgs.append(img)
         else:
             try:
-                page = requests.get(self.repo_link, verify=self.ssl_verify).text
+                imgs = [img.name for img in self.listing()]
             except (socket.gaierror, requests.exceptions.ConnectionError):
                 click.echo("Check Network connection")
                 exit(1)
-
-            soup = BeautifulSoup(page, "html.parser")
-
-            for node in soup.find_all("a"):
-                img = node.get("href")
-                if img and img.endswith(self.extension) and self.version in img:
-                    imgs.append(img)
+            except requests.exceptions.RequestException as e:
+                click.echo(f"Unable to list {self.stream} {self.version} images: {e}")
+                exit(1)
         return imgs
 
-    def download(self, name):
+    def download(self, name, directory=None, rate=None, progress=True):
         """Download image with click progress bar
 
+        Image is written to a `.part` file and renamed once complete.
+
         Args:
             name (str): name of image
+            directory (str): download directory; local image path if not provided
+            rate (int): bandwidth limit in bytes per second
+            progress (bool): show progress bar
         """
         url = f"{self.repo_link}/{name}"
         try:
-            r = requests.get(url=url, stream=True)
+            r = session().get(url=url, stream=True, verify=self.ssl_verify)
         except requests.exceptions.ConnectionError:
             print(f"Unable to connect {url}")
             print("Check network connection; try again...")
@@ -90,14 +229,33 @@ class Images(Configuration):
             r.raise_for_status()
 
         total_size = int(r.headers.get("Content-Length"))
-        local_img_path = os.path.join(self.image_path, name)
+        local_img_path = os.path.join(directory or self.image_path, name)
+        throttle = Throttle(rate)
+
+        # progress written to a throwaway buffer when not shown
+        output = None if progress else io.StringIO()
 
-        with click.progressbar(r.iter_content(1024), length=total_size) as bar, open(
-            local_img_path, "wb"
+        with click.progressbar(length=total_size, file=output) as bar, open(
+            f"{local_img_path}.part", "wb"
         ) as file:
-            for chunk in bar:
+            for chunk in r.iter_content(CHUNK_SIZE):
                 file.write(chunk)
                 bar.update(len(chunk))
+                throttle(len(chunk))
+        os.rename(f"{local_img_path}.part", local_img_path)
+
+    def remote_size(self, name):
+        """Size of remote image
+
+        Args:
+            name (str): name of image
+
+        Returns:
+            int: size in bytes or None if unknown
+        """
+        r = session().head(f"{self.repo_link}/{name}", verify=self.ssl_verify, allow_redirects=True)
+        size = r.headers.get("Content-Length")
+        return int(size) if r.ok and size else None
 
     def delete(self, name):
         """Delete image
@@ -119,15 +277,93 @@ class Images(Configuration):
         return cls(stream=stream, version=version)
 
 
+class Catalog(Configuration):
+    """Remote images of all configured streams and versions
+
+    Args:
+        workers (int): index pages fetched at once
+    """
+
+    def __init__(self, workers=8, **kwargs):
+        super(Catalog, self).__init__(**kwargs)
+        self.workers = workers
+        self.errors = {}
+
+    def key(self, image):
+        """version ordering key of remote image"""
+        return version_key(image.name, self.repositories[image.stream].versions or [])
+
+    def crawl(self):
+        """Fetch index pages of every stream and version concurrently
+
+        Failed pages are skipped and recorded in `errors` as (stream, version): error.
+
+        Returns:
+            list: RemoteImage sorted by stream and version, newest last
+        """
+        targets = [
+            (stream, version)
+            for stream, repo in self.repositories.items()
+            if repo.url
+            for version in repo.versions or []
+        ]
+
+        def _fetch(target):
+            try:
+                return Images(stream=target[0], version=target[1]).listing()
+            except requests.exceptions.RequestException as e:
+                self.errors[target] = str(e)
+                return []
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            found = [image for images in executor.map(_fetch, targets) for image in images]
+        return sorted(found, key=lambda image: (image.stream, self.key(image), image.name))
+
+    def latest(self, prefix=None):
+        """Newest remote image
+
+        Args:
+            prefix (str): image name prefix (e.g. `cfme-rhevm-5.11`)
+
+        Returns:
+            RemoteImage: None if nothing matches
+        """
+        found = [image for image in self.crawl() if image.name.startswith(prefix or "")]
+        if not found:
+            return None
+        return max(found, key=lambda image: (self.key(image), image.date or datetime.min))
+
+
 @click.command(help="Check available images")
 @click.option("-l", "--local", is_flag=True, help="Local images as per stream and version")
 @click.option("-r", "--remote", is_flag=True, help="Remote images as per stream and version")
+@click.option(
+    "-a", "--all", "all_", is_flag=True, help="Remote images of all streams and versions (remote)"
+)
 @click.option("-f", "--filter", type=str, help="Filter specific image")
-def images(local, remote, filter):
+def images(local, remote, all_, filter):
     """Display images"""
 
     conf = Configuration()
 
+    if local and all_:
+        raise click.UsageError("--all lists remote images; it cannot be used with --local")
+
+    if all_:
+        catalog = Catalog()
+        found = [image for image in catalog.crawl() if not filter or filter in image.name]
+        for (stream, version), error in catalog.errors.items():
+            click.echo(click.style(f"{stream} {version}: {error}", fg="red"), err=True)
+
+        width = max([len(image.name) for image in found] or [0])
+        for image in found:
+            date = image.date.strftime("%Y-%m-%d %H:%M") if image.date else "-"
+            click.echo(
+                f"{click.style(image.name.ljust(width), fg='green')}  "
+                f"{image.stream:<10}  {image.version:<14}  {human_size(image.size):>7}  {date}"
+            )
+        return
+
     if remote or local:
         streams = list(conf.repositories.keys())
         stream = click.prompt("stream:", default=streams[0], type=click.Choice(streams))
@@ -147,16 +383,39 @@ def images(local, remote, filter):
             click.echo(click.style(img, fg="green"))
 
 
+def resolve_latest(prefix=None):
+    """Name of newest remote image; exits if none matches
+
+    Args:
+        prefix (str): image name prefix
+    """
+    image = Catalog().latest(prefix=prefix)
+    if not image:
+        click.echo(click.style(f"No remote image matching '{prefix or ''}'", fg="red"))
+        exit(1)
+    click.echo(f"Latest image: {image.name}")
+    return image.name
+
+
 @click.command(help="Download Image")
-@click.argument("image_name")
-def pull(image_name):
+@click.argument("image_name", required=False)
+@click.option("-r", "--rate", type=int, help="Bandwidth limit in KiB/s")
+@click.option("--latest", is_flag=True, help="Newest remote image (image name used as prefix)")
+def pull(image_name, rate, latest):
     """Pull image available on remote repository"""
 
+    if latest:
+        image_name = resolve_latest(image_name)
+    elif not image_name:
+        click.echo("Please provide image name or --latest")
+        exit(1)
+
     images = Images.instantiate_with_image(image_name)
+    rate = rate or images.qos.download_rate
 
     if image_name not in images.images(local=True):
         images = Images.instantiate_with_image(image_name)
-        images.download(image_name)
+        images.download(image_name, rate=rate * 1024 if rate else None)
 
     else:
         click.echo(click.style(f"{image_name} already available", fg="red"))
@@ -0,0 +1,78 @@
+import json
+import os
+
+from miqbox.configuration import HOME
+
+JOURNAL_PATH = os.path.join(HOME, ".miqbox", "journal")
+
+
+class Journal(object):
+    """Resources created while provisioning an appliance
+
+    Entries are written to disk as they are recorded, so provisioning interrupted by a crash
+    or signal can be rolled back by a later run. Committing removes the journal.
+
+    Args:
+        name (str): name of appliance
+        directory (str): journal directory
+    """
+
+    def __init__(self, name, directory=JOURNAL_PATH):
+        self.name = name
+        self.path = os.path.join(directory, f"{name}.json")
+        self.pid = os.getpid()
+        self.domains = []
+        self.files = []
+
+    def record(self, domain=None, file=None):
+        """Record domain name or file about to be created"""
+        if domain:
+            self.domains.append(domain)
+        if file:
+            self.files.append(file)
+        self.write()
+
+    def write(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        data = {"pid": self.pid, "domains": self.domains, "files": self.files}
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump(data, f)
+        os.rename(f"{self.path}.tmp", self.path)
+
+    def commit(self):
+        """Provisioning succeeded; forget recorded resources"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def is_stale(self):
+        """check process which wrote journal is gone"""
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            data = json.load(f)
+        journal = cls(os.path.basename(path)[: -len(".json")], os.path.dirname(path))
+        journal.pid = data.get("pid", 0)
+        journal.domains = data.get("domains") or []
+        journal.files = data.get("files") or []
+        return journal
+
+    @classmethod
+    def stale(cls, directory=JOURNAL_PATH):
+        """Journals left by provisioning processes which are gone"""
+        if not os.path.isdir(directory):
+            return []
+        journals = [
+            cls.load(os.path.join(directory, file))
+            for file in sorted(os.listdir(directory))
+            if file.endswith(".json")
+        ]
+        return [journal for journal in journals if journal.is_stale]
@@ -0,0 +1,187 @@
+import gzip
+import os
+import shlex
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+
+from miqbox.miqbox import MiqBox
+
+# remote log locations; shell globs cover appliance and postgres version differences
+LOGS = {
+    "evm": ["/var/www/miq/vmdb/log/evm.log"],
+    "production": ["/var/www/miq/vmdb/log/production.log"],
+    "automation": ["/var/www/miq/vmdb/log/automation.log"],
+    "postgresql": [
+        "/var/lib/pgsql/data/log/postgresql*.log",
+        "/var/opt/rh/rh-postgresql*/lib/pgsql/data/log/postgresql*.log",
+    ],
+}
+
+COLORS = ("green", "cyan", "yellow", "magenta", "blue", "red")
+
+BUFFER_SIZE = 1024 * 1024
+
+# seconds to reach appliance over ssh before reporting it unreachable
+CONNECT_TIMEOUT = 10
+
+
+class Logs(object):
+    """Collect logs of many appliances concurrently
+
+    Args:
+        apps (list): appliances
+        logs (list): log names from `LOGS`
+    """
+
+    def __init__(self, apps, logs):
+        self.apps = apps
+        self.logs = logs
+        self._lock = threading.Lock()
+
+    def paths(self, ssh, log):
+        """Remote files of log present on appliance"""
+        patterns = " ".join(LOGS[log])
+        out = ssh.run_command(f"ls -1 {patterns} 2>/dev/null")
+        return [path for path in out.stdout.splitlines() if path]
+
+    def echo(self, prefix, color, line):
+        with self._lock:
+            click.echo(f"{click.style(prefix, fg=color)} | {line}")
+
+    def tail(self, lines=10, follow=True):
+        """Print log lines of all appliances prefixed with appliance and log name
+
+        Args:
+            lines (int): last lines to show first
+            follow (bool): keep following until interrupted
+        """
+        stop = threading.Event()
+        threads = []
+
+        def _tail(app, ssh, log, color):
+            paths = self.paths(ssh, log)
+            if not paths:
+                return
+            prefix = f"{app.name}:{log}"
+            command = "tail -q -n {} {} {}".format(
+                lines, "-F" if follow else "", " ".join(shlex.quote(path) for path in paths)
+            )
+            ssh.stream(command, lambda line: self.echo(prefix, color, line), stop=stop)
+
+        def _tail_log(app, ssh, log, color):
+            try:
+                _tail(app, ssh, log, color)
+            except Exception as e:
+                self.echo(f"{app.name}:{log}", "red", f"tail failed: {e}")
+
+        def _tail_app(app, color):
+            # one ssh connection per appliance; a channel per log
+            try:
+                ssh = app.connect_ssh(timeout=CONNECT_TIMEOUT)
+            except Exception as e:
+                self.echo(app.name, "red", f"ssh failed: {e}")
+                return
+            channels = [
+                threading.Thread(target=_tail_log, args=(app, ssh, log, color), daemon=True)
+                for log in self.logs
+            ]
+            for channel in channels:
+                channel.start()
+            for channel in channels:
+                channel.join()
+
+        for index, app in enumerate(self.apps):
+            thread = threading.Thread(
+                target=_tail_app, args=(app, COLORS[index % len(COLORS)]), daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+
+    def download(self, directory, jobs=8):
+        """Download gzip compressed logs of all appliances in parallel over sftp
+
+        Args:
+            directory (str): local directory; one sub directory per appliance holding remote
+                paths
+            jobs (int): parallel downloads
+
+        Appliances or files failing over ssh/sftp are reported and skipped.
+
+        Returns:
+            list: local files downloaded
+        """
+
+        def _files(app):
+            try:
+                ssh = app.connect_ssh(timeout=CONNECT_TIMEOUT)
+                return [(app, ssh, path) for log in self.logs for path in self.paths(ssh, log)]
+            except Exception as e:
+                self.echo(app.name, "red", f"listing logs failed: {e}")
+                return []
+
+        def _download(app, ssh, path):
+            # remote path kept; logs of different directories may share name
+            local = os.path.join(directory, app.name, f"{path.lstrip('/')}.gz")
+            os.makedirs(os.path.dirname(local), exist_ok=True)
+
+            try:
+                with ssh.sftp as sftp, sftp.open(path, "rb") as remote:
+                    remote.prefetch()
+                    with gzip.open(local, "wb", compresslevel=6) as f:
+                        shutil.copyfileobj(remote, f, BUFFER_SIZE)
+            except Exception as e:
+                if os.path.exists(local):
+                    os.remove(local)
+                self.echo(app.name, "red", f"{path} download failed: {e}")
+                return None
+            self.echo(app.name, "green", f"{path} -> {local}")
+            return local
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            files = [item for items in executor.map(_files, self.apps) for item in items]
+            return [local for local in executor.map(lambda item: _download(*item), files) if local]
+
+
+@click.command(help="Appliance Logs")
+@click.argument("names_or_ids", nargs=-1)
+@click.option(
+    "-l",
+    "--log",
+    "logs",
+    multiple=True,
+    type=click.Choice(list(LOGS)),
+    help="Logs to collect (default evm)",
+)
+@click.option("-n", "--lines", default=10, help="Last lines to show")
+@click.option("-f", "--follow", is_flag=True, help="Follow logs")
+@click.option("-d", "--download", type=click.Path(), help="Download compressed logs to directory")
+@click.option("-j", "--jobs", default=8, help="Parallel downloads")
+def logs(names_or_ids, logs, lines, follow, download, jobs):
+    """Tail or download logs of running appliances (all if none given)"""
+
+    box = MiqBox()
+    if names_or_ids:
+        apps = [box.get_appliance(name, status="running") for name in names_or_ids]
+    else:
+        apps = list(box.appliances(status="running").values())
+
+    if not apps or not all(apps):
+        click.echo("Please select proper Name or Id of running appliance")
+        exit(1)
+
+    collector = Logs(apps, list(logs) or ["evm"])
+    if download:
+        files = collector.download(download, jobs=jobs)
+        click.echo(click.style(f"{len(files)} log(s) downloaded to {download}", fg="green"))
+    else:
+        collector.tail(lines=lines, follow=follow)
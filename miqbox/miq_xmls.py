@@ -1,5 +1,11 @@
 # xml formats for libvirt
 
+# namespace of miqbox domain metadata
+METADATA_URI = "https://github.com/digitronik/miqbox"
+
+LABELS = """<labels>{labels}</labels>"""
+
+LABEL = """<label name="{name}" value="{value}" />"""
 
 POOL = """
 <pool type="dir">
@@ -17,12 +23,12 @@ POOL = """
 
 VOLUME = """
 <volume>
-   <name>{name}.{format}</name>
-   <allocation>0</allocation>
+   <name>{name}.{extension}</name>
+   <allocation unit="G">{allocation}</allocation>
    <capacity unit="G">{size}</capacity>
    <target>
-      <format type="qcow2" />
-      <path>{path}/{name}.{format}</path>
+      <format type="{format}" />{features}
+      <path>{path}/{name}.{extension}</path>
       <permissions>
          <owner>107</owner>
          <group>107</group>
@@ -36,10 +42,10 @@ VOLUME = """
 APPLIANCE = """
 <domain type="kvm">
    <name>{name}</name>
-   <description>{stream}-{provider}-{version}</description>
+   <description>{stream}-{provider}-{version}</description>{metadata}
    <memory unit="G">{memory}</memory>
    <currentMemory unit="G">{memory}</currentMemory>
-   <vcpu placement="static">{cpu}</vcpu>
+   <vcpu placement="static">{cpu}</vcpu>{tuning}
    <resource>
       <partition>/machine</partition>
    </resource>
@@ -51,7 +57,7 @@ APPLIANCE = """
       <acpi />
       <apic />
       <vmport state="off" />
-   </features>
+   </features>{cpu_model}
    <clock offset="utc">
       <timer name="rtc" tickpolicy="catchup" />
       <timer name="pit" tickpolicy="delay" />
@@ -67,18 +73,18 @@ APPLIANCE = """
    <devices>
       <emulator>/usr/bin/qemu-kvm</emulator>
       <disk type="file" device="disk">
-         <driver name="qemu" type="qcow2" />
+         <driver name="qemu" type="qcow2"{base_driver} />
          <source file="{path}/{base_img}" />
          <backingStore />
          <target dev="vda" bus="virtio" />
-         <alias name="virtio-disk0" />
+         <alias name="virtio-disk0" />{iotune}
       </disk>
       <disk type="file" device="disk">
-         <driver name="qemu" type="qcow2" />
+         <driver name="qemu" type="{db_format}"{db_driver} />
          <source file="{path}/{db_img}" />
          <backingStore />
          <target dev="vdb" bus="virtio" />
-         <alias name="virtio-disk1" />
+         <alias name="virtio-disk1" />{iotune}
       </disk>
       <interface type="network">
          <source network="default" bridge="virbr0" />
@@ -91,11 +97,100 @@ APPLIANCE = """
       </input>
       <input type="keyboard" bus="ps2">
          <alias name="input2" />
-      </input>
-      <graphics type="spice" port="5900" autoport="yes" listen="127.0.0.1">
-         <listen type="address" address="127.0.0.1" />
-         <image compression="off" />
-      </graphics>
+      </input>{devices}
    </devices>
 </domain>
 """
+
+# optional qcow2 volume elements
+
+CLUSTER_SIZE = """      <clusterSize unit="KiB">{size}</clusterSize>"""
+
+LAZY_REFCOUNTS = """      <compat>1.1</compat>
+      <features>
+         <lazy_refcounts />
+      </features>"""
+
+# optional domain elements used by appliance profiles
+
+METADATA = """   <metadata>
+      <miqbox:labels xmlns:miqbox="{uri}">{labels}</miqbox:labels>
+   </metadata>"""
+
+IOTHREADS = """   <iothreads>{count}</iothreads>"""
+
+CPUTUNE = """   <cputune>
+{entries}
+   </cputune>"""
+
+VCPUPIN = """      <vcpupin vcpu="{vcpu}" cpuset="{cpuset}" />"""
+
+SHARES = """      <shares>{shares}</shares>"""
+
+BLKIOTUNE = """   <blkiotune>
+      <weight>{weight}</weight>
+   </blkiotune>"""
+
+IOTUNE = """         <iotune>
+{entries}
+         </iotune>"""
+
+IOTUNE_ENTRY = """            <{name}>{value}</{name}>"""
+
+HUGEPAGES = """   <memoryBacking>
+      <hugepages />
+   </memoryBacking>"""
+
+NUMATUNE = """   <numatune>
+      <memory mode="preferred" nodeset="{nodeset}" />
+   </numatune>"""
+
+CPU_MODEL = """   <cpu mode="{mode}" check="none" />"""
+
+GRAPHICS = """      <graphics type="spice" port="5900" autoport="yes" listen="127.0.0.1">
+         <listen type="address" address="127.0.0.1" />
+         <image compression="off" />
+      </graphics>"""
+
+CONSOLE = """      <serial type="pty">
+         <target port="0" />
+      </serial>
+      <console type="pty">
+         <target type="serial" port="0" />
+      </console>"""
+
+MEMBALLOON = """      <memballoon model="virtio" autodeflate="on">
+         <stats period="{period}" />
+      </memballoon>"""
+
+GUEST_AGENT = """      <channel type="unix">
+         <target type="virtio" name="org.qemu.guest_agent.0" />
+      </channel>"""
+
+SEED = """      <disk type="file" device="cdrom">
+         <driver name="qemu" type="raw" />
+         <source file="{path}" />
+         <target dev="sda" bus="sata" />
+         <readonly />
+      </disk>"""
+
+SNAPSHOT = """
+<domainsnapshot>
+   <name>{name}</name>
+   {memory}
+   <disks>
+{disks}
+   </disks>
+</domainsnapshot>
+"""
+
+SNAPSHOT_MEMORY = """<memory snapshot="external" file="{file}" />"""
+
+SNAPSHOT_NO_MEMORY = """<memory snapshot="no" />"""
+
+SNAPSHOT_DISK = """      <disk name="{dev}" snapshot="external">
+         <driver type="qcow2" />
+         <source file="{file}" />
+      </disk>"""
+
+SNAPSHOT_NO_DISK = """      <disk name="{dev}" snapshot="no" />"""
@@ -5,11 +5,16 @@
 # This file is part of miqbox project. You can redistribute it and/or modify
 # it under the terms of the GNU General Public License as published by
 # the Free Software Foundation; either version (GPLv2) of the License.
+import io
 import os
+import re
+import shlex
+import subprocess
+import threading
 import time
 import xml.etree.ElementTree as ET
+from collections import namedtuple
 from distutils.version import LooseVersion
-from shutil import copyfile
 from shutil import get_terminal_size
 
 import click
@@ -18,11 +23,33 @@ import requests
 import urllib3
 
 from miqbox.client import Client
+from miqbox.clone import clone
+from miqbox.domain import appliance_xml
+from miqbox.domain import host_cells
 from miqbox.exception import DBConfigError
-from miqbox.miq_xmls import APPLIANCE
+from miqbox.exception import ProfileError
+from miqbox.exception import ProvisionError
+from miqbox.exception import SeedError
+from miqbox.exception import SnapshotError
+from miqbox.images import Images
+from miqbox.images import resolve_latest
+from miqbox.journal import Journal
+from miqbox.miq_xmls import CLUSTER_SIZE
+from miqbox.miq_xmls import LABEL
+from miqbox.miq_xmls import LABELS
+from miqbox.miq_xmls import LAZY_REFCOUNTS
+from miqbox.miq_xmls import METADATA_URI
 from miqbox.miq_xmls import POOL
+from miqbox.miq_xmls import SNAPSHOT
+from miqbox.miq_xmls import SNAPSHOT_DISK
+from miqbox.miq_xmls import SNAPSHOT_MEMORY
+from miqbox.miq_xmls import SNAPSHOT_NO_DISK
+from miqbox.miq_xmls import SNAPSHOT_NO_MEMORY
 from miqbox.miq_xmls import VOLUME
+from miqbox.resolver import resolver
+from miqbox.seed import Seed
 from miqbox.ssh import SSH
+from miqbox.transport import Agent
 
 APP_STATES = {
     libvirt.VIR_DOMAIN_RUNNING: "running",
@@ -34,6 +61,15 @@ APP_STATES = {
     libvirt.VIR_DOMAIN_NOSTATE: "no state",
 }
 
+# kernel samepage merging counters
+KSM_PATH = "/sys/kernel/mm/ksm"
+
+# snapshot names become part of overlay file names in storage pool
+SNAPSHOT_NAME = re.compile(r"[\w.-]+")
+
+# stale journals are rolled back by one provisioning thread at a time
+_recover_lock = threading.Lock()
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
@@ -105,26 +141,407 @@ class MiqBox(Client):
 
         return pool
 
-    def create_disk(self, name, size, format="qcow2"):
+    def create_disk(self, name, size, format="qcow2", volume=None):
         """Create storage disk
 
+        Preallocation modes: `off` allocates on first write, `metadata` preallocates qcow2
+        metadata, `falloc` reserves the whole capacity with fallocate and `full` writes the whole
+        capacity out. libvirt only knows fallocate, so `full` disks are created with `qemu-img`
+        in the pool directory and picked up by refreshing the pool.
+
         Args:
             name (str): disk name
             size (int): disk size
             format (str): disk image format for upstream qc2 and qcow2 for downstream.
+            volume (namedtuple): database volume settings (format, preallocation, cluster_size,
+                lazy_refcounts); configuration defaults if not provided.
 
         Returns:
             libvirt volume
         """
-        stgvol_xml = VOLUME.format(name=name, size=size, format=format, path=self.libvirt.pool_path)
+        volume = volume or self.database
+        features = []
+        flags = 0
+
+        if volume.format == "raw":
+            extension = "img"
+        else:
+            extension = format
+            if volume.cluster_size:
+                features.append(CLUSTER_SIZE.format(size=volume.cluster_size))
+            if volume.lazy_refcounts:
+                features.append(LAZY_REFCOUNTS)
+            if volume.preallocation == "metadata":
+                flags |= libvirt.VIR_STORAGE_VOL_CREATE_PREALLOC_METADATA
+
         pool = self.pool if self.pool else self.create_pool()
 
+        if volume.preallocation == "full":
+            options = ["preallocation=full"]
+            if volume.format != "raw" and volume.cluster_size:
+                options.append(f"cluster_size={volume.cluster_size}K")
+            if volume.format != "raw" and volume.lazy_refcounts:
+                options.append("lazy_refcounts=on")
+            path = os.path.join(self.libvirt.pool_path, f"{name}.{extension}")
+            command = ["qemu-img", "create", "-q", "-f", volume.format, "-o", ",".join(options)]
+            try:
+                subprocess.run(command + [path, f"{size}G"], check=True)
+                pool.refresh(0)
+                return pool.storageVolLookupByName(f"{name}.{extension}")
+            except (OSError, subprocess.CalledProcessError, libvirt.libvirtError):
+                return None
+
+        stgvol_xml = VOLUME.format(
+            name=name,
+            size=size,
+            allocation=size if volume.preallocation == "falloc" else 0,
+            format=volume.format,
+            extension=extension,
+            features="".join(f"\n{feature}" for feature in features),
+            path=self.libvirt.pool_path,
+        )
+
         try:
-            return pool.createXML(stgvol_xml, 0)
+            return pool.createXML(stgvol_xml, flags)
         except libvirt.libvirtError:
             return None
 
-    def create_appliance(self, name, base_img, db_img, cpu, memory, stream, provider, version):
+    def provision(
+        self,
+        name,
+        image,
+        cpu,
+        memory,
+        db_size,
+        profile=None,
+        volume=None,
+        seed=False,
+        configure=False,
+        ssh_keys=None,
+        progress=True,
+        labels=None,
+    ):
+        """Create disks and appliance domain from local image
+
+        Appliance is defined with provisioning QoS; waiting for it and configuration are left to
+        the caller. Disks and domain are recorded in a journal and removed again if provisioning
+        fails or is interrupted.
+
+        Args:
+            name (str): name of appliance
+            image (str): local image name
+            cpu (int): cpu count
+            memory (int): memory in GB
+            db_size (int): database disk size in GB
+            profile (str): performance profile name; configuration default if not provided
+            volume (namedtuple): database volume settings; configuration default if not provided
+            seed (bool): attach first boot seed drive
+            configure (bool): configure database (from seed drive if seed)
+            ssh_keys (list): public keys authorized by seed drive
+            progress (bool): show base disk clone progress
+            labels (dict): labels stored in appliance domain metadata at definition
+
+        Returns:
+            Appliance
+
+        Raises:
+            ProvisionError: image, disk or domain creation failed
+        """
+        profile = profile or self.profile
+        volume = volume or self.database
+        qos = self.qos
+        stream, prov, version, *_ = image.split("-")
+        extension = image.split(".")[-1]
+        base_disk_name = f"{name}.{extension}"
+
+        if profile not in self.profiles:
+            raise ProvisionError(
+                f"Profile '{profile}' not available; select from: {', '.join(self.profiles)}"
+            )
+
+        if image not in os.listdir(self.image_path):
+            raise ProvisionError(f"Image '{image}' not available.")
+
+        source = os.path.join(self.image_path, image)
+        destination = os.path.join(self.libvirt.pool_path, base_disk_name)
+        rate = qos.copy_rate * 1024 * 1024 if qos.copy_rate else None
+        output = None if progress else io.StringIO()
+
+        db_extension = "img" if volume.format == "raw" else extension
+        db_disk = os.path.join(self.libvirt.pool_path, f"{name}-db.{db_extension}")
+        seed_iso = os.path.join(self.libvirt.pool_path, f"{name}-seed.iso") if seed else None
+
+        # interrupted runs may have left disks of this very appliance
+        self.recover()
+
+        # journal only holds what this run creates; rollback must not remove anything else
+        for file in filter(None, (destination, db_disk, seed_iso)):
+            if os.path.exists(file):
+                raise ProvisionError(f"Disk '{os.path.basename(file)}' already exists.")
+        try:
+            self.driver.lookupByName(name)
+        except libvirt.libvirtError:
+            pass
+        else:
+            raise ProvisionError(f"Appliance '{name}' already exists.")
+
+        journal = Journal(name)
+        try:
+            journal.record(file=destination)
+            with click.progressbar(length=os.path.getsize(source), file=output) as bar:
+                method = clone(source, destination, rate=rate, progress=bar.update)
+            click.echo(f"Base appliance disk created ({method}).")
+
+            journal.record(file=db_disk)
+            db = self.create_disk(name=f"{name}-db", size=db_size, format=extension, volume=volume)
+            if not db:
+                raise ProvisionError("Database disk creation fails.")
+            click.echo("Database disk created.")
+
+            if seed:
+                journal.record(file=seed_iso)
+                Seed(
+                    hostname=name,
+                    credentials=self.credentials,
+                    db_password=self.db_password,
+                    region=0 if configure else None,
+                    ssh_keys=ssh_keys,
+                ).write(seed_iso)
+                click.echo("Seed drive created.")
+
+            journal.record(domain=name)
+            app = self.create_appliance(
+                name=name,
+                base_img=base_disk_name,
+                db_img=db.name(),
+                cpu=cpu,
+                memory=memory,
+                stream=stream,
+                provider=prov,
+                version=version,
+                profile=profile,
+                db_format=volume.format,
+                seed=seed_iso,
+                qos=qos.provisioning,
+                labels=labels,
+            )
+            if not app:
+                raise ProvisionError(f"Fails to create {name} appliance.")
+        except BaseException as e:
+            click.echo(f"Rolling back {name}: {', '.join(self.rollback(journal)) or 'nothing'}")
+            if isinstance(e, (OSError, libvirt.libvirtError, SeedError)):
+                raise ProvisionError(f"Fails to create {name} appliance: {e}") from e
+            raise
+        journal.commit()
+
+        click.echo(f"Appliance {name} created successfully...")
+        return app
+
+    def recover(self):
+        """Roll back provisioning interrupted by processes which are gone
+
+        Returns:
+            dict: appliance name: removed resources
+        """
+        recovered = {}
+        with _recover_lock:
+            for journal in Journal.stale():
+                recovered[journal.name] = self.rollback(journal)
+                click.echo(
+                    f"Rolled back interrupted provisioning of {journal.name}: "
+                    f"{', '.join(recovered[journal.name]) or 'nothing'}"
+                )
+        return recovered
+
+    def rollback(self, journal):
+        """Remove domains and files recorded in provisioning journal
+
+        Args:
+            journal (Journal): journal of failed provisioning
+
+        Returns:
+            list: removed resources
+        """
+        removed = []
+        for name in reversed(journal.domains):
+            try:
+                domain = self.driver.lookupByName(name)
+            except libvirt.libvirtError:
+                continue
+            if domain.isActive():
+                domain.destroy()
+            domain.undefineFlags(
+                libvirt.VIR_DOMAIN_UNDEFINE_MANAGED_SAVE
+                | libvirt.VIR_DOMAIN_UNDEFINE_SNAPSHOTS_METADATA
+            )
+            removed.append(name)
+
+        for file in reversed(journal.files):
+            if os.path.isfile(file):
+                os.remove(file)
+                removed.append(os.path.basename(file))
+
+        if self.pool:
+            self.pool.refresh(0)
+        resolver(self.url).invalidate()
+        journal.commit()
+        return removed
+
+    def capacity(self):
+        """Free host memory and pool space for new appliances
+
+        Running appliances count at their current balloon size less memory KSM shares between
+        them, as in `overcommit`. Memory is the lower of free host memory and host memory not
+        backing appliances, so appliances which have not touched all their memory still count.
+
+        Returns:
+            namedtuple: memory and disk in bytes, committed memory and effective overcommit
+                (memory, disk, committed, effective)
+        """
+        Capacity = namedtuple("Capacity", ["memory", "disk", "committed", "effective"])
+        usage = self.overcommit()
+        committed = max(usage.ballooned - usage.shared, 0)
+        memory = min(self.driver.getFreeMemory(), usage.host - committed)
+
+        pool = self.pool if self.pool else self.create_pool()
+        pool.refresh(0)
+        return Capacity(max(memory, 0), pool.info()[3], committed, usage.effective)
+
+    def admit(self, count, image, memory, db_size, volume=None, profile=None):
+        """Plan how many appliances of batch fit on host
+
+        Base disk need is allocated size of local image (holes are not copied); database disk
+        needs its capacity only when preallocated. Appliances of ballooning profiles (e.g.
+        `dense`) need their memory over the effective overcommit of running appliances, but
+        no less than the balloon controller `min_ratio` of it.
+
+        Args:
+            count (int): requested appliances
+            image (str): local image name
+            memory (int): memory per appliance in GB
+            db_size (int): database disk size per appliance in GB
+            volume (namedtuple): database volume settings; configuration default if not provided
+            profile (str): performance profile; configuration default if not provided
+
+        Returns:
+            namedtuple: (requested, admitted, reasons)
+        """
+        Admission = namedtuple("Admission", ["requested", "admitted", "reasons"])
+        volume = volume or self.database
+        profile = self.profiles[profile or self.profile]
+        conf = self.admission
+        capacity = self.capacity()
+        gib = 1024 ** 3
+
+        disk_need = os.stat(os.path.join(self.image_path, image)).st_blocks * 512
+        if volume.preallocation in ("falloc", "full"):
+            disk_need += db_size * gib
+        memory_need = memory * gib
+        if profile.balloon and not profile.hugepages:
+            memory_need = max(
+                memory_need / max(capacity.effective, 1), memory_need * self.density.min_ratio
+            )
+
+        limits = {
+            "memory": (memory_need, capacity.memory - conf.reserve_memory * gib),
+            "disk": (disk_need, capacity.disk - conf.reserve_disk * gib),
+        }
+        admitted = count
+        reasons = []
+
+        for resource, (need, available) in limits.items():
+            fit = max(int(available // need), 0) if need else count
+            if fit < count:
+                reasons.append(
+                    f"{resource}: {fit} of {count} fit; {need / gib:.1f} GiB each, "
+                    f"{max(available, 0) / gib:.1f} GiB available after reserve"
+                )
+            admitted = min(admitted, fit)
+        return Admission(count, admitted, reasons)
+
+    @staticmethod
+    def ksm():
+        """Kernel samepage merging counters of host; empty if not available
+
+        Returns:
+            dict: counter (run, pages_shared, pages_sharing, ...): value
+        """
+        counters = {}
+        if not os.path.isdir(KSM_PATH):
+            return counters
+        for counter in os.listdir(KSM_PATH):
+            try:
+                with open(os.path.join(KSM_PATH, counter)) as f:
+                    counters[counter] = int(f.read().strip())
+            except (OSError, ValueError):
+                continue
+        return counters
+
+    def overcommit(self):
+        """Memory overcommit of running appliances
+
+        `ratio` is memory given to appliances over host memory; `effective` is memory given to
+        appliances over memory actually backing them after ballooning and KSM page sharing.
+
+        Returns:
+            namedtuple: (host, committed, ballooned, shared, ratio, effective); sizes in bytes
+        """
+        Overcommit = namedtuple(
+            "Overcommit", ["host", "committed", "ballooned", "shared", "ratio", "effective"]
+        )
+        conn = self.driver
+        stats = conn.getAllDomainStats(
+            libvirt.VIR_DOMAIN_STATS_BALLOON, libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_RUNNING
+        )
+        committed = sum(data.get("balloon.maximum", 0) for _, data in stats) * 1024
+        ballooned = sum(data.get("balloon.current", 0) for _, data in stats) * 1024
+        shared = self.ksm().get("pages_sharing", 0) * os.sysconf("SC_PAGE_SIZE")
+        host = conn.getInfo()[1] * 1024 * 1024
+        backing = ballooned - shared
+        return Overcommit(
+            host,
+            committed,
+            ballooned,
+            shared,
+            committed / host if host else 0,
+            committed / backing if backing > 0 else 0,
+        )
+
+    def cpuset(self, count):
+        """Host cpus to pin new appliance vcpus on
+
+        Cpus already taken by vcpus of running appliances are skipped in round robin.
+
+        Args:
+            count (int): vcpu count
+
+        Returns:
+            list: host cpu ids
+        """
+        conn = self.driver
+        online = [cpu for cpu, up in enumerate(conn.getCPUMap()[1]) if up]
+        used = sum(
+            domain.info()[3]
+            for domain in conn.listAllDomains(libvirt.VIR_CONNECT_LIST_DOMAINS_ACTIVE)
+        )
+        return [online[(used + vcpu) % len(online)] for vcpu in range(count)]
+
+    def create_appliance(
+        self,
+        name,
+        base_img,
+        db_img,
+        cpu,
+        memory,
+        stream,
+        provider,
+        version,
+        profile="default",
+        db_format="qcow2",
+        seed=None,
+        qos=None,
+        labels=None,
+    ):
         """Create appliance domain
 
         Args:
@@ -136,13 +553,33 @@ class MiqBox(Client):
             stream (str): appliance stream (cfme/manageiq)
             provider (str): appliance provider (rhv/osp/etc...)
             version (str): appliance version
+            profile (str): performance profile name
+            db_format (str): database disk format (qcow2/raw)
+            seed (str): first boot seed iso path
+            qos (namedtuple): quality of service (cpu_shares, io_weight, iops, bps)
+            labels (dict): labels stored in domain metadata
 
         Return: libvirt domain
         """
-        app_xml = APPLIANCE.format(
+        profile = self.profiles[profile]
+        cpuset = cells = None
+
+        if profile.pinning:
+            cpuset = self.cpuset(int(cpu))
+            cells = host_cells(self.driver.getCapabilities())
+
+        app_xml = appliance_xml(
+            profile=profile,
+            cpuset=cpuset,
+            cells=cells,
+            seed=seed,
+            qos=qos,
+            agent=self.transport_type != "ssh",
+            labels=labels,
             name=name,
             base_img=base_img,
             db_img=db_img,
+            db_format=db_format,
             cpu=str(cpu),
             memory=str(memory),
             path=self.libvirt.pool_path,
@@ -153,6 +590,7 @@ class MiqBox(Client):
         try:
             dom = self.driver.defineXML(app_xml)
             dom.create()
+            resolver(self.url).invalidate()
             return Appliance(name=name)
         except libvirt.libvirtError:
             return None
@@ -205,24 +643,210 @@ class Appliance(Client):
         except libvirt.libvirtError:
             return None
 
-    def start(self):
-        """start appliance"""
+    @property
+    def labels(self):
+        """labels stored in appliance domain metadata"""
+        try:
+            data = self.app.metadata(libvirt.VIR_DOMAIN_METADATA_ELEMENT, METADATA_URI, 0)
+        except libvirt.libvirtError:
+            return {}
+        return {label.get("name"): label.get("value") for label in ET.fromstring(data)}
+
+    def set_label(self, name, value=None):
+        """Set or remove (value None) label in appliance domain metadata
+
+        Args:
+            name (str): label name
+            value (str): label value
+        """
+        labels = self.labels
+        if value is None:
+            labels.pop(name, None)
+        else:
+            labels[name] = value
+
+        data = LABELS.format(
+            labels="".join(LABEL.format(name=key, value=val) for key, val in labels.items())
+        )
+        flags = libvirt.VIR_DOMAIN_AFFECT_CONFIG
+        if self.is_active:
+            flags |= libvirt.VIR_DOMAIN_AFFECT_LIVE
+        self.app.setMetadata(
+            libvirt.VIR_DOMAIN_METADATA_ELEMENT, data, "miqbox", METADATA_URI, flags
+        )
+
+    @property
+    def disks(self):
+        """target devices of appliance disks (cdroms excluded)"""
+        return [
+            disk.find("target").get("dev")
+            for disk in self.xml_data.findall("devices/disk")
+            if disk.get("device") == "disk"
+        ]
+
+    @property
+    def qos(self):
+        """current quality of service values
+
+        Returns:
+            dict: cpu_shares, io_weight, iops, bps
+        """
+        flags = libvirt.VIR_DOMAIN_AFFECT_CURRENT
+        tune = self.app.blockIoTune(self.disks[0], flags) if self.disks else {}
+        return {
+            "cpu_shares": self.app.schedulerParametersFlags(flags).get("cpu_shares"),
+            "io_weight": self.app.blkioParameters(flags).get("weight"),
+            "iops": tune.get("total_iops_sec"),
+            "bps": tune.get("total_bytes_sec"),
+        }
+
+    def set_qos(self, qos):
+        """Apply quality of service to appliance (live if running and persistent)
+
+        Args:
+            qos (namedtuple): cpu_shares, io_weight, iops, bps; None values are left unchanged
+                except disk limits which are removed
+        """
+        flags = libvirt.VIR_DOMAIN_AFFECT_CONFIG
         if self.is_active:
+            flags |= libvirt.VIR_DOMAIN_AFFECT_LIVE
+
+        if qos.cpu_shares:
+            self.app.setSchedulerParametersFlags({"cpu_shares": qos.cpu_shares}, flags)
+        if qos.io_weight:
+            self.app.setBlkioParameters({"weight": qos.io_weight}, flags)
+
+        for disk in self.disks:
+            self.app.setBlockIoTune(
+                disk, {"total_iops_sec": qos.iops or 0, "total_bytes_sec": qos.bps or 0}, flags
+            )
+
+    @property
+    def cpu(self):
+        """vcpu count of persistent configuration"""
+        xml = ET.fromstring(self.app.XMLDesc(libvirt.VIR_DOMAIN_XML_INACTIVE))
+        return int(xml.find("vcpu").text)
+
+    @property
+    def memory(self):
+        """memory of persistent configuration in GiB"""
+        xml = ET.fromstring(self.app.XMLDesc(libvirt.VIR_DOMAIN_XML_INACTIVE))
+        return int(xml.find("memory").text) // (1024 * 1024)
+
+    def resize(self, cpu=None, memory=None):
+        """Change vcpus and memory of appliance
+
+        Persistent configuration always changes; running appliance changes live only within
+        limits it was booted with, else on next boot.
+
+        Args:
+            cpu (int): vcpu count
+            memory (int): memory in GiB
+
+        Returns:
+            bool: True if applied to running appliance too
+        """
+        config = libvirt.VIR_DOMAIN_AFFECT_CONFIG
+        changes = []
+
+        if cpu:
+            # maximum must never be below current
+            flags = [config | libvirt.VIR_DOMAIN_VCPU_MAXIMUM, config]
+            if cpu < self.cpu:
+                flags.reverse()
+            for flag in flags:
+                self.app.setVcpusFlags(cpu, flag)
+            changes.append((self.app.setVcpusFlags, cpu))
+
+        if memory:
+            kib = memory * 1024 * 1024
+            flags = [config | libvirt.VIR_DOMAIN_MEM_MAXIMUM, config]
+            if memory < self.memory:
+                flags.reverse()
+            for flag in flags:
+                self.app.setMemoryFlags(kib, flag)
+            changes.append((self.app.setMemoryFlags, kib))
+
+        if not self.is_active:
+            return False
+        try:
+            for func, value in changes:
+                func(value, libvirt.VIR_DOMAIN_AFFECT_LIVE)
+        except libvirt.libvirtError:
+            return False
+        return True
+
+    @property
+    def is_saved(self):
+        """check appliance has managed save image"""
+        return bool(self.app.hasManagedSaveImage(0))
+
+    def start(self, fresh=False):
+        """start appliance; resumes from managed save image if available
+
+        Args:
+            fresh (bool): discard managed save image and boot cold
+        """
+        if self.state == libvirt.VIR_DOMAIN_PAUSED:
+            self.app.resume()
+            return True
+        elif self.is_active:
             return False
         else:
+            if fresh and self.is_saved:
+                self.app.managedSaveRemove(0)
             self.app.create()
+            resolver(self.url).invalidate()
+            return True
+
+    def save(self, image_format=None):
+        """managed save appliance memory state and stop it
+
+        Args:
+            image_format (str): save image format (raw, gzip, bzip2, xz, lzop, zstd);
+                hypervisor default if not provided
+        """
+        image_format = image_format or self.save_image_format
+
+        if image_format:
+            param = getattr(libvirt, "VIR_DOMAIN_SAVE_PARAM_IMAGE_FORMAT", None)
+            if param:
+                self.app.saveParams({param: image_format}, 0)
+                return
+            click.echo(
+                f"libvirt does not support save image format; '{image_format}' ignored..."
+            )
+        self.app.managedSave(0)
+
+    def suspend(self):
+        """pause running appliance; memory stays allocated"""
+        if self.state == libvirt.VIR_DOMAIN_RUNNING:
+            self.app.suspend()
             return True
+        return False
 
-    def stop(self):
-        """stop appliance"""
+    def stop(self, save=False):
+        """stop appliance
+
+        Args:
+            save (bool): managed save memory state instead of shutdown
+        """
         if self.is_active:
-            self.app.shutdown()
+            if save:
+                self.save()
+            else:
+                self.app.shutdown()
+            resolver(self.url).invalidate()
             return True
         else:
             return False
 
     def kill(self):
-        """remove appliance"""
+        """remove appliance
+
+        Returns:
+            list: removed disk names; False if appliance did not shut down
+        """
         if self.is_active:
             self.stop()
             timeout = time.time() + 120
@@ -231,14 +855,14 @@ class Appliance(Client):
                 if not self.is_active:
                     break
                 if time.time() > timeout:
-                    print("Fail to shutdown appliance")
                     return False
 
+        # overlays left unused by reverts are not in disk chains any more
+        self.cleanup_overlays()
         storage_db = {item.name(): item for item in self.pool.listAllVolumes()}
-        disks = self.xml_data.findall("devices/disk")
+        removed = []
 
-        for disk in disks:
-            source = disk.find("source").get("file")
+        for source in sorted(self.files):
             file = os.path.basename(source)
             storage = storage_db.get(file)
 
@@ -247,31 +871,158 @@ class Appliance(Client):
 
             if os.path.isfile(source):
                 os.remove(source)
-
-            print(f"Disk '{file} removed'...")
+            removed.append(file)
 
         # undefine appliance to remove
-        self.app.undefine()
-        return True
+        self.app.undefineFlags(
+            libvirt.VIR_DOMAIN_UNDEFINE_MANAGED_SAVE
+            | libvirt.VIR_DOMAIN_UNDEFINE_SNAPSHOTS_METADATA
+        )
+        resolver(self.url).invalidate()
+        return removed
 
     @property
-    def hostname(self):
-        """Get hostname assigned to appliances"""
+    def files(self):
+        """pool files used by appliance (disk chains, snapshot overlays, memory images)"""
+        files = set()
+
+        def _collect(xml):
+            for disk in xml.iter("disk"):
+                files.update(
+                    source.get("file") for source in disk.iter("source") if source.get("file")
+                )
+            files.update(
+                memory.get("file") for memory in xml.iter("memory") if memory.get("file")
+            )
+
+        _collect(self.xml_data)
+        for snapshot in self.app.listAllSnapshots(0):
+            _collect(ET.fromstring(snapshot.getXMLDesc(0)))
+
+        pool_path = os.path.abspath(self.libvirt.pool_path)
+        return {file for file in files if os.path.dirname(os.path.abspath(file)) == pool_path}
 
-        ips = dict()
-        if self.app.isActive():
-            ifaces = self.app.interfaceAddresses(
-                libvirt.VIR_DOMAIN_INTERFACE_ADDRESSES_SRC_LEASE, 0
+    @property
+    def snapshots(self):
+        """snapshot names of appliance ordered by creation time"""
+        snapshots = [
+            (int(ET.fromstring(snap.getXMLDesc(0)).findtext("creationTime", "0")), snap.getName())
+            for snap in self.app.listAllSnapshots(0)
+        ]
+        return [name for _, name in sorted(snapshots)]
+
+    def snapshot(self, name, memory=False):
+        """Create external snapshot of appliance disks
+
+        Args:
+            name (str): snapshot name
+            memory (bool): include memory state (running appliance only)
+
+        Raises:
+            SnapshotError: invalid name or snapshot creation failed
+        """
+        if not SNAPSHOT_NAME.fullmatch(name) or ".." in name:
+            raise SnapshotError(
+                f"Invalid snapshot name '{name}'; use letters, digits, '_', '-' and '.'"
             )
-            for iface, address in ifaces.items():
-                ips[iface] = [
-                    item["addr"]
-                    for item in address["addrs"]
-                    if item["type"] == libvirt.VIR_IP_ADDR_TYPE_IPV4
-                ]
 
-        ips = [ips[0] for conn, ips in ips.items() if conn != "lo"]
-        return ips[0] if ips else "---"
+        prefix = os.path.join(self.libvirt.pool_path, f"{self.app.name()}-snap-{name}")
+        disks = []
+
+        for disk in self.xml_data.findall("devices/disk"):
+            dev = disk.find("target").get("dev")
+            if disk.get("device") == "disk":
+                disks.append(SNAPSHOT_DISK.format(dev=dev, file=f"{prefix}-{dev}.qcow2"))
+            else:
+                disks.append(SNAPSHOT_NO_DISK.format(dev=dev))
+
+        flags = libvirt.VIR_DOMAIN_SNAPSHOT_CREATE_ATOMIC
+        if memory:
+            if not self.is_active:
+                raise SnapshotError("Memory state needs running appliance")
+            memory_xml = SNAPSHOT_MEMORY.format(file=f"{prefix}.mem")
+        else:
+            memory_xml = SNAPSHOT_NO_MEMORY
+            flags |= libvirt.VIR_DOMAIN_SNAPSHOT_CREATE_DISK_ONLY
+
+        snapshot_xml = SNAPSHOT.format(name=name, memory=memory_xml, disks="\n".join(disks))
+        try:
+            self.app.snapshotCreateXML(snapshot_xml, flags)
+        except libvirt.libvirtError as e:
+            raise SnapshotError(f"Fail to create snapshot {name}: {e}")
+
+    def revert(self, name):
+        """Revert appliance to snapshot and remove stale overlays
+
+        Snapshots with memory resume their saved state; disk-only snapshots boot from the disk
+        state if appliance was running.
+
+        Args:
+            name (str): snapshot name
+        """
+        try:
+            snapshot = self.app.snapshotLookupByName(name, 0)
+        except libvirt.libvirtError:
+            raise SnapshotError(f"Snapshot {name} not found")
+
+        memory = ET.fromstring(snapshot.getXMLDesc(0)).find("memory")
+        has_memory = memory is not None and memory.get("snapshot") != "no"
+        flags = 0
+
+        if not has_memory and self.is_active:
+            self.app.destroy()
+            flags |= libvirt.VIR_DOMAIN_SNAPSHOT_REVERT_RUNNING
+
+        try:
+            self.app.revertToSnapshot(snapshot, flags)
+        except libvirt.libvirtError as e:
+            raise SnapshotError(f"Fail to revert snapshot {name}: {e}")
+        finally:
+            resolver(self.url).invalidate()
+
+        self.cleanup_overlays()
+
+    def delete_snapshot(self, name):
+        """Delete snapshot and remove overlays no longer used
+
+        Args:
+            name (str): snapshot name
+        """
+        try:
+            self.app.snapshotLookupByName(name, 0).delete(0)
+        except libvirt.libvirtError as e:
+            raise SnapshotError(f"Fail to delete snapshot {name}: {e}")
+        self.cleanup_overlays()
+
+    def cleanup_overlays(self):
+        """Remove snapshot overlays of appliance not used by disks or snapshots
+
+        Overlays are `snapshot` files (`<appliance>-snap-*`) and those libvirt creates when
+        reverting to external snapshot, named after image they are put on top of as
+        `<image without extension>.<timestamp>`.
+
+        Returns:
+            list: removed files
+        """
+        used = {os.path.basename(file) for file in self.files}
+        patterns = [f"{re.escape(self.app.name())}-snap-.*"]
+        patterns += [rf"{re.escape(os.path.splitext(file)[0])}\.\d+" for file in used]
+        overlay = re.compile("|".join(patterns))
+        removed = []
+
+        for file in os.listdir(self.libvirt.pool_path):
+            if overlay.fullmatch(file) and file not in used:
+                os.remove(os.path.join(self.libvirt.pool_path, file))
+                removed.append(file)
+
+        if removed and self.pool:
+            self.pool.refresh(0)
+        return removed
+
+    @property
+    def hostname(self):
+        """Get hostname assigned to appliances"""
+        return resolver(self.url).lookup(self.app.name()) or "---"
 
     @property
     def stream(self):
@@ -292,27 +1043,55 @@ class Appliance(Client):
         """Get information of appliances
 
         Returns:
-            dirt: having id, name, state, hostname
+            dirt: having id, name, state, hostname, saved, snapshots
         """
         return {
             "id": self.app.ID() if self.app.ID() > 0 else "---",
             "name": self.app.name(),
             "state": APP_STATES[self.app.state()[0]],
             "hostname": self.hostname,
+            "saved": "saved" if self.is_saved else "---",
+            "snapshots": ",".join(self.snapshots) or "---",
         }
 
     @property
     def ssh_client(self):
         """return ssh instance"""
+        return self.connect_ssh()
+
+    def connect_ssh(self, timeout=60):
+        """new ssh session
+
+        Raises:
+            SSHError: not connected within timeout
+        """
         return SSH(
-            hostname=self.hostname, username=self.creds.username, password=self.creds.password
+            hostname=self.hostname,
+            username=self.creds.username,
+            password=self.creds.password,
+            timeout=timeout,
         )
 
+    @property
+    def agent(self):
+        """guest agent transport if enabled in configuration and answering; else None"""
+        if self.transport_type == "ssh":
+            return None
+        agent = Agent(self.app)
+        if self.transport_type == "agent" or agent.is_active:
+            return agent
+        return None
+
+    @property
+    def transport(self):
+        """command transport as per configuration; guest agent or ssh"""
+        return self.agent or self.ssh_client
+
     def configure(self, region=0, disk="/dev/vdb"):
         """Configure application database"""
-        out = self.ssh_client.run_command(
-            f"appliance_console_cli --region {region} "
-            f"--internal --force-key -p smartvm --dbdisk {disk}"
+        out = self.transport.run_command(
+            f"appliance_console_cli --region {region} --internal --force-key "
+            f"-p {shlex.quote(self.db_password)} --dbdisk {disk}"
         )
         if out.rc == 0:
             click.echo(out.stdout)
@@ -322,7 +1101,7 @@ class Appliance(Client):
 
     def restart_evmserverd(self):
         """restart evm server"""
-        out = self.ssh_client.run_command("systemctl restart evmserverd")
+        out = self.transport.run_command("systemctl restart evmserverd")
         return out.rc == 0
 
     @property
@@ -336,6 +1115,21 @@ class Appliance(Client):
         except Exception:
             return False
 
+    def wait_for_hostname(self, timeout=90):
+        """wait for appliance to get hostname
+
+        Returns:
+            bool: True if hostname assigned within timeout
+        """
+        click.echo("Waiting for hostname...")
+        timeout_start = time.time()
+
+        while time.time() < timeout_start + timeout:
+            if self.hostname.count(".") == 3:
+                return True
+            time.sleep(1)
+        return False
+
     def wait_for_ui(self, timeout=180):
         """wait for appliance web-ui up and running"""
         click.echo("Waiting for Web-UI...")
@@ -346,161 +1140,174 @@ class Appliance(Client):
                 break
 
 
-@click.command(help="Appliance Status")
-@click.option("-a", "--all", is_flag=True, help="All Appliances")
-@click.option("-r", "--running", is_flag=True, help="All Running Appliances")
-@click.option("-s", "--stop", is_flag=True, help="All Stopped Appliances")
-def status(all, running, stop):
-    """Get appliances status"""
-
-    if running:
-        status = "running"
-    elif stop:
-        status = "shut off"
-    else:
-        status = None
-
-    box = MiqBox()
-    data = [Appliance(name=name).info() for name in box.appliances(status=status)]
-    entities = "{:<5s}{:<28s}{:^15s}{:^15s}"
-    for index, info in enumerate(data):
-        if not index:
-            click.echo(entities.format("Id", "Name", "Status", "Hostname"))
-        click.echo(entities.format(str(info["id"]), info["name"], info["state"], info["hostname"]))
-
-
-@click.command(help="Start Appliance")
-@click.argument("name", type=click.STRING)
-def start(name):
-    """ Start/ Invoke appliance"""
-
-    box = MiqBox()
-    app = box.get_appliance(name, status="shut off")
-
-    if app:
-        app.start()
-    else:
-        click.echo(f"Appliance {name} not found")
-        click.echo("Select from appliance: ")
-        for app_name in box.appliances(status="shut off"):
-            click.echo(app_name)
-
-
-@click.command(help="Restart Miq/CFME Server")
-@click.option("-r", "--restart", nargs=1)
-def evmserver(restart):
-    """Restart Miq/CFME server of appliance"""
-
-    box = MiqBox()
-    app = box.get_appliance(restart, status="running")
-    if app.restart_evmserverd():
-        click.echo(f"{app.app.name()} server restarted successfully...")
-
-
-@click.command(help="Stop Appliance")
-@click.argument("name")
-def stop(name):
-    """Stop running appliance"""
-
-    box = MiqBox()
-    app = box.get_appliance(name, status="running")
-
-    if app:
-        app.stop()
-    else:
-        click.echo("Select from running appliance:")
-        for app_name in box.appliances(status="running"):
-            click.echo(app_name)
-
-
-@click.command(help="Kill Appliance")
-@click.argument("names_or_ids", nargs=-1)
-def kill(names_or_ids):
-    """Kill appliance"""
-    box = MiqBox()
-    for name in names_or_ids:
-        app = box.get_appliance(name)
-
-        if app:
-            app.kill()
-        else:
-            click.echo("Please select proper Name or Id of appliance")
-
-
 @click.command(help="Create Appliance")
-@click.option("--image", prompt="Image name")
+@click.option("--name", default=None, help="Appliance name (prompted if not provided)")
+@click.option("--image", default=None, help="Image name (prompted if not provided)")
+@click.option("--latest", is_flag=True, help="Newest remote image (image used as prefix)")
 @click.option("--cpu", default=1, prompt="CPU count")
 @click.option("--memory", default=4, prompt="Memory in GiB")
 @click.option("--db_size", default=5, prompt="Database size in GiB")
 @click.option("--count", default=1, prompt="Number of appliance")
-def create(image, cpu, memory, db_size, count, configure=False):
+@click.option("--profile", default=None, help="Performance profile (default from configuration)")
+@click.option("--db_format", type=click.Choice(["qcow2", "raw"]), help="Database disk format")
+@click.option(
+    "--db_prealloc",
+    type=click.Choice(["off", "metadata", "falloc", "full"]),
+    help="Database disk preallocation",
+)
+@click.option("--db_cluster_size", type=int, help="Database qcow2 cluster size in KiB")
+@click.option(
+    "--db_lazy_refcounts/--no_db_lazy_refcounts",
+    default=None,
+    help="Database qcow2 lazy refcounts",
+)
+@click.option("--seed", is_flag=True, help="Configure appliance at first boot from seed drive")
+@click.option("--ssh_key", multiple=True, help="Public key file authorized by seed drive")
+@click.option(
+    "--configure/--no_configure",
+    default=None,
+    help="Setup internal database (prompted for downstream if not provided)",
+)
+@click.option(
+    "--admission",
+    type=click.Choice(["reject", "scale", "off"]),
+    help="Batch not fitting host: reject, scale down or provision anyway",
+)
+def create(
+    name,
+    image,
+    latest,
+    cpu,
+    memory,
+    db_size,
+    count,
+    profile,
+    db_format,
+    db_prealloc,
+    db_cluster_size,
+    db_lazy_refcounts,
+    seed,
+    ssh_key,
+    configure,
+    admission,
+):
     """Create appliance"""
     _apps = {}
     box = MiqBox()
+    profile = profile or box.profile
+    volume = box.database
+    volume = volume._replace(
+        format=db_format or volume.format,
+        preallocation=db_prealloc or volume.preallocation,
+        cluster_size=db_cluster_size or volume.cluster_size,
+        lazy_refcounts=volume.lazy_refcounts if db_lazy_refcounts is None else db_lazy_refcounts,
+    )
+
+    try:
+        profiles = box.profiles
+    except ProfileError as e:
+        raise click.ClickException(str(e))
+
+    if profile not in profiles:
+        click.echo(f"Profile '{profile}' not available.")
+        click.echo(f"Select from profiles: {', '.join(profiles)}")
+        exit(1)
+
+    if latest:
+        image = resolve_latest(image)
+        if image not in os.listdir(box.image_path):
+            rate = box.qos.download_rate
+            Images.instantiate_with_image(image).download(image, rate=rate * 1024 if rate else None)
+    image = image or click.prompt("Image name")
     stream, prov, version, *_ = image.split("-")
-    extension = image.split(".")[-1]
 
-    name = click.prompt("Appliance Name:", default=f"{stream}-{version}")
-    if stream != "manageiq":
+    if image not in os.listdir(box.image_path):
+        click.echo("Image '{img}' not available.".format(img=image))
+        exit(0)
+
+    name = name or click.prompt("Appliance Name:", default=f"{stream}-{version}")
+    if configure is None:
         # pre-database configuration only need for downstream
-        configure = click.confirm("Do you want to setup internal database?")
+        configure = stream != "manageiq" and click.confirm(
+            "Do you want to setup internal database?"
+        )
 
-    for _ in range(count):
-        app_name = f"{name}-{time.strftime('%y%m%d-%H%M%S')}"
-        db_disk_name = f"{app_name}-db"
-        base_disk_name = f"{app_name}.{extension}"
-
-        if image in os.listdir(box.image_path):
-            source = os.path.join(box.image_path, image)
-            destination = os.path.join(box.libvirt.pool_path, base_disk_name)
-            copyfile(source, destination)
-            click.echo("Base appliance disk created.")
-        else:
-            click.echo("Image '{img}' not available.".format(img=image))
-            exit(0)
+    # before admission; leftover disks count against pool space
+    box.recover()
 
-        db = box.create_disk(name=db_disk_name, size=db_size, format=extension)
+    admission = admission or box.admission.policy
+    if admission != "off":
+        plan = box.admit(count, image, memory, db_size, volume=volume, profile=profile)
+        for reason in plan.reasons:
+            click.echo(reason)
 
-        if db:
-            click.echo("Database disk created.")
-        else:
-            click.echo("Database disk creation fails.")
-            os.remove(destination)
-            exit(1)
+        if plan.admitted < count:
+            if admission == "scale" and plan.admitted:
+                click.echo(f"Scaling batch down to {plan.admitted} of {count} appliance(s).")
+                count = plan.admitted
+            else:
+                click.echo(click.style(f"Not enough capacity for {count} appliance(s).", fg="red"))
+                exit(1)
 
-        app = box.create_appliance(
-            name=app_name,
-            base_img=base_disk_name,
-            db_img=db.name(),
-            cpu=cpu,
-            memory=memory,
-            stream=stream,
-            provider=prov,
-            version=version,
-        )
-        if app:
-            click.echo(f"Appliance {app_name} created successfully...")
+    qos = box.qos
 
-            click.echo("Waiting for hostname...")
-            start_time = time.time()
+    ssh_keys = list(box.ssh_keys)
+    for path in ssh_key:
+        with open(os.path.expanduser(path)) as f:
+            ssh_keys.append(f.read().strip())
 
-            while time.time() < start_time + 90:
-                if app.hostname.count(".") == 3:
-                    break
-            else:
-                click.echo("Unable to get hostname for appliance.")
-                exit(0)
-            # save hostname
-            _apps[app_name] = app.hostname
-        else:
-            click.echo(f"Fails to create {app_name} appliance.")
+    # appliances configuring themselves from seed drive; waited for after all are created
+    pending = []
+
+    for index in range(count):
+        app_name = f"{name}-{time.strftime('%y%m%d-%H%M%S')}"
+        if count > 1:
+            app_name = f"{app_name}-{index}"
+
+        try:
+            app = box.provision(
+                name=app_name,
+                image=image,
+                cpu=cpu,
+                memory=memory,
+                db_size=db_size,
+                profile=profile,
+                volume=volume,
+                seed=seed,
+                configure=configure,
+                ssh_keys=ssh_keys,
+            )
+        except ProvisionError as e:
+            click.echo(e)
             exit(1)
 
+        if seed:
+            pending.append(app)
+            continue
+
+        if not app.wait_for_hostname():
+            click.echo("Unable to get hostname for appliance.")
+            exit(0)
+        # save hostname
+        _apps[app_name] = app.hostname
+
         if configure:
             click.echo(f"Appliance hostname: {app.hostname}")
             click.echo("Database configuration will take some time...")
             app.configure()
             app.wait_for_ui()
+        app.set_qos(qos.serving)
+
+    for app in pending:
+        if not app.wait_for_hostname():
+            click.echo(f"Unable to get hostname for {app.name}.")
+            continue
+        _apps[app.name] = app.hostname
+
+        if configure:
+            click.echo(f"{app.name} configures database at first boot...")
+            app.wait_for_ui(timeout=900)
+        app.set_qos(qos.serving)
 
     if _apps:
         columns = get_terminal_size().columns
@@ -515,3 +1322,104 @@ def create(image, cpu, memory, db_size, count, configure=False):
             )
         )
         click.echo("=" * columns)
+
+
+@click.command(help="Appliance QoS")
+@click.argument("name")
+@click.option("--cpu_shares", type=int, help="CPU shares")
+@click.option("--io_weight", type=int, help="Block I/O weight (100-1000)")
+@click.option("--iops", type=int, help="Disk IOPS limit (0 removes)")
+@click.option("--bps", type=int, help="Disk bytes/s limit (0 removes)")
+@click.option("--serving", "preset", flag_value="serving", help="Apply serving defaults")
+@click.option(
+    "--provisioning", "preset", flag_value="provisioning", help="Apply provisioning defaults"
+)
+def qos(name, cpu_shares, io_weight, iops, bps, preset):
+    """Show or change appliance QoS live"""
+
+    box = MiqBox()
+    app = box.get_appliance(name)
+
+    if not app:
+        click.echo("Please select proper Name or Id of appliance")
+        exit(1)
+
+    current = app.qos
+    if preset or any(value is not None for value in (cpu_shares, io_weight, iops, bps)):
+        values = getattr(box.qos, preset) if preset else box.qos.serving._replace(**current)
+        values = values._replace(
+            cpu_shares=cpu_shares or values.cpu_shares,
+            io_weight=io_weight or values.io_weight,
+            iops=values.iops if iops is None else iops,
+            bps=values.bps if bps is None else bps,
+        )
+        app.set_qos(values)
+        current = app.qos
+
+    for key, value in current.items():
+        click.echo(f"{key}: {value or '---'}")
+
+
+@click.command(help="Snapshot Appliance")
+@click.argument("name")
+@click.argument("snapshot")
+@click.option("-m", "--memory", is_flag=True, help="Include memory state")
+@click.option("-d", "--delete", is_flag=True, help="Delete snapshot")
+def snapshot(name, snapshot, memory, delete):
+    """Create or delete appliance snapshot"""
+
+    box = MiqBox()
+    app = box.get_appliance(name)
+
+    if not app:
+        click.echo("Please select proper Name or Id of appliance")
+        exit(1)
+
+    try:
+        if delete:
+            app.delete_snapshot(snapshot)
+            click.echo(f"Snapshot {snapshot} deleted")
+        else:
+            app.snapshot(snapshot, memory=memory)
+            click.echo(f"Snapshot {snapshot} created")
+    except SnapshotError as e:
+        click.echo(e)
+        exit(1)
+
+
+@click.command(help="Revert Appliance to Snapshot")
+@click.argument("name")
+@click.argument("snapshot")
+def revert(name, snapshot):
+    """Revert appliance to snapshot"""
+
+    box = MiqBox()
+    app = box.get_appliance(name)
+
+    if not app:
+        click.echo("Please select proper Name or Id of appliance")
+        exit(1)
+
+    try:
+        app.revert(snapshot)
+        click.echo(f"{name} reverted to {snapshot}")
+    except SnapshotError as e:
+        click.echo(e)
+        exit(1)
+
+
+@click.command(help="List Appliance Snapshots")
+@click.argument("name")
+def snapshots(name):
+    """List appliance snapshots"""
+
+    box = MiqBox()
+    app = box.get_appliance(name)
+
+    if not app:
+        click.echo("Please select proper Name or Id of appliance")
+        exit(1)
+
+    current = app.app.snapshotCurrent(0).getName() if app.app.hasCurrentSnapshot(0) else None
+    for snap in app.snapshots:
+        click.echo(click.style(snap, fg="green", bold=snap == current))
@@ -0,0 +1,229 @@
+import os
+import re
+import threading
+import time
+from http.server import HTTPServer
+from http.server import SimpleHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+import click
+import requests
+
+from miqbox.configuration import Configuration
+from miqbox.images import Images
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class MirrorRequestHandler(SimpleHTTPRequestHandler):
+    """Serve mirror directory with HTTP Range support"""
+
+    root = None
+
+    def translate_path(self, path):
+        path = super(MirrorRequestHandler, self).translate_path(path)
+        return os.path.join(self.root, os.path.relpath(path, os.getcwd()))
+
+    def end_headers(self):
+        if not getattr(self, "_range", None):
+            self.send_header("Accept-Ranges", "bytes")
+        super(MirrorRequestHandler, self).end_headers()
+
+    def send_head(self):
+        self._range = None
+        path = self.translate_path(self.path)
+        match = re.match(r"bytes=(\d*)-(\d*)$", self.headers.get("Range", "").strip())
+
+        if not match or not os.path.isfile(path) or not any(match.groups()):
+            return super(MirrorRequestHandler, self).send_head()
+
+        size = os.path.getsize(path)
+        first, last = match.groups()
+        if first:
+            start, end = int(first), min(int(last) if last else size - 1, size - 1)
+        else:
+            # suffix range: last n bytes
+            start, end = max(size - int(last), 0), size - 1
+
+        if start > end:
+            self._range = True
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.end_headers()
+            return None
+
+        f = open(path, "rb")
+        f.seek(start)
+        self._range = end - start + 1
+        self.send_response(206)
+        self.send_header("Content-type", self.guess_type(path))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(self._range))
+        self.send_header("Last-Modified", self.date_time_string(os.path.getmtime(path)))
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        if not self._range:
+            return super(MirrorRequestHandler, self).copyfile(source, outputfile)
+
+        remaining = self._range
+        while remaining > 0:
+            chunk = source.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+
+class MirrorServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class Mirror(Configuration):
+    """Local image mirror
+
+    Mirror directory follows repository layout; `<mirror url>/<stream>` can be used as
+    repository url of stream by other miqbox installations.
+
+    Args:
+        path (str): mirror directory
+        rate (int): bandwidth limit in bytes per second
+    """
+
+    def __init__(self, path=None, rate=None, **kwargs):
+        super(Mirror, self).__init__(**kwargs)
+        self.path = path or self.mirror.path
+        self.rate = rate
+
+    def target(self, images):
+        """Local directory mirroring repository link of images
+
+        Args:
+            images (Images): images of stream and version
+        """
+        path = os.path.join(self.path, images.stream)
+        if images.stream == "downstream":
+            base_version = ".".join(images.version.split(".")[:2])
+            path = os.path.join(path, "builds", "cfme", base_version, "stable")
+        return path
+
+    def selection(self, select=None):
+        """Selected (stream, version) pairs
+
+        Args:
+            select (list): `stream/version` items; mirror configuration or all if not provided
+        """
+        select = select or self.mirror.select
+        if select:
+            return [tuple(item.split("/", 1)) for item in select]
+        return [
+            (stream, version)
+            for stream, repo in self.repositories.items()
+            if repo.url
+            for version in repo.versions
+        ]
+
+    def sync(self, stream, version, filter=None, progress=True):
+        """Download images of stream and version not yet mirrored
+
+        Args:
+            stream (str): upstream or downstream
+            version (str): build version
+            filter (str): only images having filter in name
+            progress (bool): show progress bar
+
+        Returns:
+            list: downloaded images
+        """
+        images = Images(stream=stream, version=version)
+        target = self.target(images)
+        os.makedirs(target, exist_ok=True)
+        synced = []
+
+        for name in images.images():
+            if filter and filter not in name:
+                continue
+
+            local = os.path.join(target, name)
+            if os.path.isfile(local) and os.path.getsize(local) == images.remote_size(name):
+                continue
+
+            click.echo(f"Mirroring {stream}/{version}: {name}")
+            images.download(name, directory=target, rate=self.rate, progress=progress)
+            synced.append(name)
+        return synced
+
+    def sync_all(self, select=None, filter=None, progress=True):
+        """Sync all selected streams and versions
+
+        Returns:
+            list: downloaded images
+        """
+        synced = []
+        for stream, version in self.selection(select):
+            try:
+                synced.extend(self.sync(stream, version, filter=filter, progress=progress))
+            except (requests.exceptions.RequestException, SystemExit):
+                click.echo(f"Fail to sync {stream}/{version}; retry on next run")
+        return synced
+
+    def background(self, interval, select=None, filter=None):
+        """Keep syncing in background thread
+
+        Args:
+            interval (int): seconds between syncs
+
+        Returns:
+            threading.Thread
+        """
+
+        def _run():
+            while True:
+                self.sync_all(select=select, filter=filter, progress=False)
+                time.sleep(interval)
+
+        thread = threading.Thread(target=_run, name="miqbox-mirror", daemon=True)
+        thread.start()
+        return thread
+
+    def serve(self, bind="0.0.0.0", port=None):
+        """Serve mirror over HTTP (blocking)
+
+        Args:
+            bind (str): address to listen on
+            port (int): port to listen on
+        """
+        handler = type("Handler", (MirrorRequestHandler,), {"root": self.path})
+        server = MirrorServer((bind, port or self.mirror.port), handler)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+
+@click.command(help="Mirror Images")
+@click.option("-s", "--select", multiple=True, help="stream/version to mirror (repeatable)")
+@click.option("-f", "--filter", type=str, help="Mirror only images having filter")
+@click.option("-r", "--rate", type=int, help="Bandwidth limit in KiB/s")
+@click.option("-i", "--interval", type=int, help="Seconds between background syncs")
+@click.option("-p", "--port", type=int, help="HTTP port")
+@click.option("--bind", default="0.0.0.0", help="HTTP bind address")
+@click.option("--sync-only", is_flag=True, help="Sync once and exit without serving")
+def mirror(select, filter, rate, interval, port, bind, sync_only):
+    """Sync images to local mirror and serve them over HTTP"""
+
+    conf = Configuration().mirror
+    rate = rate or conf.rate
+    mirror = Mirror(rate=rate * 1024 if rate else None)
+
+    if sync_only:
+        synced = mirror.sync_all(select=select, filter=filter)
+        click.echo(click.style(f"{len(synced)} image(s) mirrored", fg="green"))
+        return
+
+    mirror.background(interval or conf.interval, select=select, filter=filter)
+    port = port or conf.port
+    click.echo(f"Serving {mirror.path} on http://{bind}:{port}")
+    click.echo(f"Point repository url to http://<host>:{port}/<stream>")
+    mirror.serve(bind=bind, port=port)
@@ -0,0 +1,158 @@
+import time
+
+import click
+import libvirt
+
+from miqbox.miqbox import Appliance
+from miqbox.miqbox import MiqBox
+
+KEEPALIVE = "keepalive"
+
+STATS = (
+    libvirt.VIR_DOMAIN_STATS_CPU_TOTAL
+    | libvirt.VIR_DOMAIN_STATS_INTERFACE
+    | libvirt.VIR_DOMAIN_STATS_BALLOON
+    | libvirt.VIR_DOMAIN_STATS_VCPU
+)
+
+
+class Reaper(MiqBox):
+    """Find idle appliances and suspend or managed-save them
+
+    Args:
+        window (int): sampling window in seconds
+        cpu (float): cpu usage threshold in percent of appliance vcpus
+        net (float): network threshold in KiB/s (rx + tx)
+        action (str): `save` (frees memory) or `suspend` (frees cpu only)
+    """
+
+    def __init__(self, window=None, cpu=None, net=None, action=None, *args, **kwargs):
+        super(Reaper, self).__init__(*args, **kwargs)
+        conf = self.reaper
+        self.window = window or conf.window
+        self.cpu = conf.cpu if cpu is None else cpu
+        self.net = conf.net if net is None else net
+        self.action = action or conf.action
+
+    def sample(self):
+        """Bulk sample stats of all running appliances
+
+        Returns:
+            dict: name: (cpu time ns, network bytes, vcpus, memory KiB)
+        """
+        stats = self.driver.getAllDomainStats(
+            STATS, libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_RUNNING
+        )
+        samples = {}
+
+        for domain, data in stats:
+            net = sum(
+                data.get(f"net.{index}.rx.bytes", 0) + data.get(f"net.{index}.tx.bytes", 0)
+                for index in range(data.get("net.count", 0))
+            )
+            samples[domain.name()] = (
+                data.get("cpu.time", 0),
+                net,
+                data.get("vcpu.current", 1),
+                data.get("balloon.current", 0),
+            )
+        return samples
+
+    def activity(self):
+        """Activity of running appliances over sampling window
+
+        Returns:
+            dict: name: (cpu percent, network KiB/s, memory KiB)
+        """
+        first = self.sample()
+        start = time.time()
+        time.sleep(self.window)
+        second = self.sample()
+        elapsed = time.time() - start
+
+        activity = {}
+        for name, (cpu_time, net, vcpus, memory) in second.items():
+            if name not in first:
+                continue
+            cpu = (cpu_time - first[name][0]) / (elapsed * 1e9 * vcpus) * 100
+            rate = (net - first[name][1]) / elapsed / 1024
+            activity[name] = (cpu, rate, memory)
+        return activity
+
+    def reap(self, dry_run=False):
+        """Suspend or save idle appliances
+
+        Args:
+            dry_run (bool): only report idle appliances
+
+        Returns:
+            list: (name, cpu percent, network KiB/s, reclaimed memory KiB) of reaped appliances
+        """
+        reaped = []
+
+        for name, (cpu, rate, memory) in self.activity().items():
+            if cpu >= self.cpu or rate >= self.net:
+                continue
+
+            app = Appliance(name=name)
+            if app.labels.get(KEEPALIVE) == "true":
+                continue
+
+            if not dry_run:
+                if self.action == "save":
+                    app.stop(save=True)
+                else:
+                    app.suspend()
+            reaped.append((name, cpu, rate, memory if self.action == "save" else 0))
+        return reaped
+
+
+@click.command(help="Suspend Idle Appliances")
+@click.option("-w", "--window", type=int, help="Sampling window in seconds")
+@click.option("--cpu", type=float, help="CPU threshold in percent")
+@click.option("--net", type=float, help="Network threshold in KiB/s")
+@click.option("-a", "--action", type=click.Choice(["save", "suspend"]), help="Action on idle")
+@click.option("--dry_run", is_flag=True, help="Only report idle appliances")
+@click.option("-d", "--daemon", is_flag=True, help="Keep reaping every interval")
+@click.option("-i", "--interval", default=300, help="Daemon interval in seconds")
+def reap(window, cpu, net, action, dry_run, daemon, interval):
+    """Suspend or managed-save idle appliances"""
+
+    reaper = Reaper(window=window, cpu=cpu, net=net, action=action)
+
+    while True:
+        reaped = reaper.reap(dry_run=dry_run)
+        entities = "{:<28s}{:>10s}{:>14s}{:>16s}"
+
+        for index, (name, cpu_usage, rate, memory) in enumerate(reaped):
+            if not index:
+                click.echo(entities.format("Name", "CPU %", "Net KiB/s", "Reclaimed MiB"))
+            click.echo(
+                entities.format(name, f"{cpu_usage:.1f}", f"{rate:.1f}", str(memory // 1024))
+            )
+
+        total = sum(item[3] for item in reaped) // 1024
+        if dry_run:
+            click.echo(f"{len(reaped)} idle appliance(s); {total} MiB memory reclaimable")
+        else:
+            click.echo(f"{len(reaped)} appliance(s) reaped; {total} MiB memory reclaimed")
+
+        if not daemon:
+            break
+        time.sleep(interval)
+
+
+@click.command(help="Protect Appliance from Reaper")
+@click.argument("name")
+@click.option("--off", is_flag=True, help="Remove keep-alive label")
+def keepalive(name, off):
+    """Set keep-alive label on appliance"""
+
+    box = MiqBox()
+    app = box.get_appliance(name)
+
+    if app:
+        app.set_label(KEEPALIVE, None if off else "true")
+        click.echo(f"Keep-alive {'removed from' if off else 'set on'} {name}")
+    else:
+        click.echo("Please select proper Name or Id of appliance")
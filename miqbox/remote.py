@@ -0,0 +1,140 @@
+import click
+
+from miqbox.exception import ApplianceNotFoundError
+from miqbox.exception import MiqBoxException
+from miqbox.rpc import dispatch
+
+# appliance commands served by miqboxd; nothing heavier than click is imported so they return
+# as soon as daemon answers (libvirt and paramiko load only for in-process fallback)
+
+
+@click.command(help="Appliance Status")
+@click.option("-a", "--all", is_flag=True, help="All Appliances")
+@click.option("-r", "--running", is_flag=True, help="All Running Appliances")
+@click.option("-s", "--stop", is_flag=True, help="All Stopped Appliances")
+def status(all, running, stop):
+    """Get appliances status"""
+
+    if running:
+        status = "running"
+    elif stop:
+        status = "shut off"
+    else:
+        status = None
+
+    data = dispatch("status", status=status)
+    entities = "{:<5s}{:<28s}{:^15s}{:^15s}{:^10s}  {:<s}"
+    for index, info in enumerate(data):
+        if not index:
+            click.echo(entities.format("Id", "Name", "Status", "Hostname", "Saved", "Snapshots"))
+        click.echo(
+            entities.format(
+                str(info["id"]),
+                info["name"],
+                info["state"],
+                info["hostname"],
+                info["saved"],
+                info["snapshots"],
+            )
+        )
+
+    if data and status in (None, "running"):
+        usage = dispatch("overcommit")
+        if usage["committed"]:
+            gib = 1024 ** 3
+            click.echo(
+                f"\nMemory: {usage['committed'] / gib:.1f} GiB given to appliances, "
+                f"{usage['ballooned'] / gib:.1f} GiB after ballooning, "
+                f"{usage['shared'] / gib:.1f} GiB shared by KSM; "
+                f"host {usage['host'] / gib:.1f} GiB"
+            )
+            click.echo(
+                f"Overcommit: {usage['ratio']:.2f}x of host memory, "
+                f"{usage['effective']:.2f}x of memory backing appliances"
+            )
+
+
+@click.command(help="Start Appliance")
+@click.argument("name", type=click.STRING)
+@click.option("--fresh", is_flag=True, help="Discard saved state and boot cold")
+def start(name, fresh):
+    """Start/ Invoke appliance"""
+
+    try:
+        message = dispatch("start", name, fresh=fresh)
+    except ApplianceNotFoundError:
+        click.echo(f"Appliance {name} not found")
+        click.echo("Select from appliance: ")
+        for info in dispatch("status", status="shut off"):
+            click.echo(info["name"])
+        return
+    except MiqBoxException as e:
+        click.echo(click.style(str(e), fg="red"))
+        exit(1)
+
+    if message:
+        click.echo(message)
+
+
+@click.command(help="Restart Miq/CFME Server")
+@click.option("-r", "--restart", nargs=1)
+def evmserver(restart):
+    """Restart Miq/CFME server of appliance"""
+
+    try:
+        if dispatch("restart_evmserverd", restart):
+            click.echo(f"{restart} server restarted successfully...")
+    except MiqBoxException as e:
+        click.echo(e)
+
+
+@click.command(help="Stop Appliance")
+@click.argument("name")
+@click.option("--save", is_flag=True, help="Save memory state for near-instant start")
+def stop(name, save):
+    """Stop running appliance"""
+
+    try:
+        dispatch("stop", name, save=save)
+    except ApplianceNotFoundError:
+        click.echo("Select from running appliance:")
+        for info in dispatch("status", status="running"):
+            click.echo(info["name"])
+    except MiqBoxException as e:
+        click.echo(click.style(str(e), fg="red"))
+        exit(1)
+
+
+@click.command(help="Kill Appliance")
+@click.argument("names_or_ids", nargs=-1)
+def kill(names_or_ids):
+    """Kill appliance"""
+    for name in names_or_ids:
+        try:
+            removed = dispatch("kill", name)
+        except ApplianceNotFoundError:
+            click.echo("Please select proper Name or Id of appliance")
+            continue
+        except MiqBoxException as e:
+            click.echo(click.style(str(e), fg="red"))
+            continue
+
+        for file in removed:
+            click.echo(f"Disk '{file}' removed...")
+
+
+@click.command(help="Run Command on Appliance", name="exec")
+@click.argument("name")
+@click.argument("command", nargs=-1, required=True)
+def exec_(name, command):
+    """Run command on running appliance over ssh"""
+
+    try:
+        out = dispatch("exec", name, " ".join(command))
+    except MiqBoxException as e:
+        click.echo(e)
+        exit(1)
+
+    click.echo(out["stdout"], nl=False)
+    click.echo(out["stderr"], nl=False, err=True)
+    exit(out["rc"])
@@ -0,0 +1,156 @@
+import time
+import xml.etree.ElementTree as ET
+
+import libvirt
+
+from miqbox.client import Client
+
+# sources used when an appliance has no DHCP lease on the network
+FALLBACK_SOURCES = (
+    libvirt.VIR_DOMAIN_INTERFACE_ADDRESSES_SRC_AGENT,
+    libvirt.VIR_DOMAIN_INTERFACE_ADDRESSES_SRC_ARP,
+)
+
+_resolvers = {}
+
+
+class AddressResolver(Client):
+    """Resolve IPv4 addresses of all appliances at once
+
+    DHCP leases of the network are read once per refresh and matched with the MAC addresses
+    of every active appliance. Results are cached until the ttl or the earliest lease expires,
+    or a lifecycle event invalidates them.
+
+    Args:
+        network (str): libvirt network serving appliances
+        ttl (int): cache lifetime in seconds
+        retry (int): minimum seconds between refreshes triggered by a cache miss
+    """
+
+    def __init__(self, network="default", ttl=30, retry=2, *args, **kwargs):
+        super(AddressResolver, self).__init__(*args, **kwargs)
+        self.network = network
+        self.ttl = ttl
+        self.retry = retry
+        self._addresses = {}
+        self._expires = 0
+        self._refreshed = 0
+        self._watch_conn = None
+
+    def leases(self, conn):
+        """DHCP leases of network
+
+        Args:
+            conn: libvirt connection
+
+        Returns:
+            tuple: (dict of mac: ip, earliest lease expiry time)
+        """
+        leases = {}
+        expires = time.time() + self.ttl
+
+        try:
+            for lease in conn.networkLookupByName(self.network).DHCPLeases():
+                if lease["type"] != libvirt.VIR_IP_ADDR_TYPE_IPV4:
+                    continue
+                leases[lease["mac"].lower()] = lease["ipaddr"]
+                if lease.get("expirytime"):
+                    expires = min(expires, lease["expirytime"])
+        except libvirt.libvirtError:
+            pass
+        return leases, expires
+
+    @staticmethod
+    def fallback(domain):
+        """Get address of domain from guest agent or ARP table
+
+        Args:
+            domain: libvirt domain
+
+        Returns:
+            str: IPv4 address or None
+        """
+        for source in FALLBACK_SOURCES:
+            try:
+                ifaces = domain.interfaceAddresses(source, 0)
+            except libvirt.libvirtError:
+                continue
+
+            for iface, address in ifaces.items():
+                if iface == "lo":
+                    continue
+                for item in address.get("addrs") or []:
+                    if item["type"] == libvirt.VIR_IP_ADDR_TYPE_IPV4 and not item[
+                        "addr"
+                    ].startswith("127."):
+                        return item["addr"]
+        return None
+
+    def refresh(self):
+        """Rebuild address cache for all active appliances"""
+        conn = self.driver
+        leases, expires = self.leases(conn)
+        addresses = {}
+
+        for domain in conn.listAllDomains(libvirt.VIR_CONNECT_LIST_DOMAINS_ACTIVE):
+            xml = ET.fromstring(domain.XMLDesc(0))
+            macs = [mac.get("address").lower() for mac in xml.findall("devices/interface/mac")]
+            ips = [leases[mac] for mac in macs if mac in leases]
+            address = ips[0] if ips else self.fallback(domain)
+
+            if address:
+                addresses[domain.name()] = address
+
+        now = time.time()
+        self._addresses = addresses
+        self._refreshed = now
+        self._expires = max(expires, now + self.retry)
+        return addresses
+
+    def lookup(self, name):
+        """Get address of appliance
+
+        Args:
+            name (str): name of appliance
+
+        Returns:
+            str: IPv4 address or None
+        """
+        now = time.time()
+        if now >= self._expires:
+            self.refresh()
+        elif name not in self._addresses and now - self._refreshed >= self.retry:
+            self.refresh()
+        return self._addresses.get(name)
+
+    def invalidate(self, *args):
+        """Drop cached addresses; next lookup reads leases again"""
+        self._expires = 0
+
+    def watch(self):
+        """Invalidate cache on domain and network lifecycle events
+
+        A libvirt event loop implementation (`libvirt.virEventRegisterDefaultImpl`) must be
+        registered and running before calling this.
+        """
+        conn = self.driver
+        conn.domainEventRegisterAny(
+            None, libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE, self.invalidate, None
+        )
+        conn.networkEventRegisterAny(
+            None, libvirt.VIR_NETWORK_EVENT_ID_LIFECYCLE, self.invalidate, None
+        )
+        # keep connection alive to receive events
+        self._watch_conn = conn
+
+
+def resolver(url=None):
+    """Shared address resolver per libvirt driver url
+
+    Args:
+        url (str): driver url
+    """
+    key = url or "default"
+    if key not in _resolvers:
+        _resolvers[key] = AddressResolver(url=url)
+    return _resolvers[key]
@@ -0,0 +1,69 @@
+import json
+import os
+import socket
+
+from miqbox import exception
+from miqbox.exception import DaemonError
+from miqbox.exception import MiqBoxException
+
+# set to any value to always run in-process
+NO_DAEMON_ENV = "MIQBOX_NO_DAEMON"
+
+
+def socket_path():
+    """miqboxd unix socket path"""
+    return os.environ.get("MIQBOX_SOCKET") or os.path.join(
+        os.environ["HOME"], ".miqbox", "miqboxd.sock"
+    )
+
+
+def call(method, *args, **kwargs):
+    """Call method on running miqboxd
+
+    Args:
+        method (str): exposed service method
+
+    Returns:
+        result of method
+
+    Raises:
+        ConnectionError: daemon not running
+        MiqBoxException: method failed in daemon with miqbox error; same type re-raised
+        DaemonError: method failed in daemon with other error
+    """
+    path = socket_path()
+    if os.environ.get(NO_DAEMON_ENV) or not os.path.exists(path):
+        raise ConnectionError("miqboxd not running")
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        request = {"method": method, "args": args, "kwargs": kwargs}
+        sock.sendall(json.dumps(request).encode() + b"\n")
+
+        with sock.makefile("rb") as f:
+            response = json.loads(f.readline() or b'{"error": "miqboxd closed connection"}')
+
+    if "error" in response:
+        error = getattr(exception, response.get("type") or "", None)
+        if isinstance(error, type) and issubclass(error, MiqBoxException):
+            raise error(response["error"])
+        raise DaemonError(response["error"])
+    return response["result"]
+
+
+def dispatch(method, *args, **kwargs):
+    """Call method on miqboxd if running else in-process
+
+    Args:
+        method (str): exposed service method
+
+    Returns:
+        result of method
+    """
+    try:
+        return call(method, *args, **kwargs)
+    except ConnectionError:
+        # daemon imports appliance modules which use dispatch
+        from miqbox.daemon import Service
+
+        return getattr(Service(), method)(*args, **kwargs)
@@ -0,0 +1,106 @@
+import io
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+
+from ruamel.yaml import YAML
+
+from miqbox.exception import SeedError
+
+# iso tools in order of preference; all accept the same mkisofs arguments
+ISO_TOOLS = ("genisoimage", "mkisofs", "xorrisofs")
+
+# NoCloud datasource is found by volume id
+ISO_ARGS = ("-volid", "cidata", "-joliet", "-rock")
+
+
+def _dump(data):
+    # YAML object works with ruamel.yaml before and after safe_dump was removed (0.18)
+    yaml = YAML(typ="safe")
+    yaml.default_flow_style = False
+    stream = io.StringIO()
+    yaml.dump(data, stream)
+    return stream.getvalue()
+
+
+class Seed(object):
+    """NoCloud seed to configure appliance at first boot
+
+    Args:
+        hostname (str): appliance hostname
+        credentials (namedtuple): appliance credentials (username, password)
+        db_password (str): database password; as used by `Appliance.configure`
+        region (int): database region; database not configured if None
+        db_disk (str): database disk device
+        ssh_keys (list): public keys authorized for appliance user
+    """
+
+    def __init__(
+        self, hostname, credentials, db_password, region=0, db_disk="/dev/vdb", ssh_keys=None
+    ):
+        self.hostname = hostname
+        self.creds = credentials
+        self.db_password = db_password
+        self.region = region
+        self.db_disk = db_disk
+        self.ssh_keys = ssh_keys or []
+
+    @property
+    def meta_data(self):
+        """NoCloud meta-data content"""
+        return _dump({"instance-id": self.hostname, "local-hostname": self.hostname})
+
+    @property
+    def user_data(self):
+        """cloud-config user-data content"""
+        data = {
+            "hostname": self.hostname,
+            "ssh_pwauth": True,
+            "chpasswd": {
+                "list": f"{self.creds.username}:{self.creds.password}",
+                "expire": False,
+            },
+        }
+
+        if self.ssh_keys:
+            data["ssh_authorized_keys"] = list(self.ssh_keys)
+
+        if self.region is not None:
+            data["runcmd"] = [
+                f"appliance_console_cli --region {self.region} --internal --force-key "
+                f"-p {shlex.quote(self.db_password)} --dbdisk {self.db_disk}"
+            ]
+        return "#cloud-config\n" + _dump(data)
+
+    @property
+    def files(self):
+        """seed files with content"""
+        return {"meta-data": self.meta_data, "user-data": self.user_data}
+
+    def write(self, path):
+        """Write seed iso
+
+        Args:
+            path (str): iso file path
+        """
+        tool = next((tool for tool in ISO_TOOLS if shutil.which(tool)), None)
+        if not tool:
+            raise SeedError(f"Need one of {', '.join(ISO_TOOLS)} to create seed iso")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            files = []
+            for name, content in self.files.items():
+                files.append(os.path.join(tmp, name))
+                with open(files[-1], "w") as f:
+                    f.write(content)
+
+            out = subprocess.run(
+                [tool, "-output", path, *ISO_ARGS, *files],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            if out.returncode != 0:
+                raise SeedError(f"Fail to create seed iso {out.stderr.decode()}")
+        return path
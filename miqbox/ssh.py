@@ -5,6 +5,8 @@ from collections import namedtuple
 import click
 import paramiko
 
+from miqbox.exception import SSHError
+
 SSHOut = namedtuple("SSHOut", ["rc", "stdout", "stderr"])
 
 
@@ -15,14 +17,21 @@ class SSH(object):
         hostname: appliance ip
         username: username of appliance
         password: password of appliance
+        timeout: seconds to keep trying to connect
+
+    Raises:
+        SSHError: not connected within timeout
     """
 
-    def __init__(self, hostname, username, password):
+    def __init__(self, hostname, username, password, timeout=60):
         self.hostname = hostname
         self.username = username
         self.password = password
         self.client = paramiko.SSHClient()
-        self.connect()
+        self.error = None
+
+        if not self.connect(timeout=timeout):
+            raise SSHError(f"Unable to connect {hostname} in {timeout}s: {self.error}")
 
     def __del__(self):
         self.client.close()
@@ -36,14 +45,25 @@ class SSH(object):
         while time.time() < timeout_start + timeout:
             try:
                 self.client.connect(
-                    hostname=self.hostname, username=self.username, password=self.password,
+                    hostname=self.hostname,
+                    username=self.username,
+                    password=self.password,
+                    timeout=max(timeout_start + timeout - time.time(), 1),
                 )
-            except Exception:
+                return True
+            except Exception as e:
                 # TODO: Include while implementing verbos
-                pass
+                self.error = e
+                time.sleep(1)
         else:
             return False
 
+    @property
+    def is_active(self):
+        """check ssh transport is still usable"""
+        transport = self.client.get_transport()
+        return bool(transport and transport.is_active())
+
     def run_commands(self, timeout=10, *commands):
         """run command with shell
 
@@ -88,3 +108,124 @@ class SSH(object):
                 session = False
 
         return SSHOut(rc=rc, stdout=stdout, stderr=stderr)
+
+    def stream(self, command, callback, stop=None):
+        """run command and pass each stdout line to callback as it arrives
+
+        Args:
+            command (str): command to run
+            callback (callable): called with each decoded line
+            stop (threading.Event): stop streaming when set
+
+        Returns:
+            int: exit status; None if stopped
+        """
+        channel = self.client.get_transport().open_session()
+        channel.settimeout(1)
+        channel.exec_command(command)
+        buffer = b""
+
+        try:
+            while not (stop and stop.is_set()):
+                try:
+                    data = channel.recv(65536)
+                except socket.timeout:
+                    continue
+                if not data:
+                    if buffer:
+                        callback(buffer.decode("utf-8", "replace"))
+                    return channel.recv_exit_status()
+                buffer += data
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    callback(line.decode("utf-8", "replace"))
+            return None
+        finally:
+            channel.close()
+
+    @property
+    def sftp(self):
+        """sftp session over ssh connection"""
+        return self.client.open_sftp()
+
+    @staticmethod
+    def _drain(channel, stdout, stderr, chunk_size=65536):
+        """read whatever stdout and stderr channel has buffered
+
+        Both are drained so command never blocks on a full window of either.
+
+        Returns:
+            bool: True if anything was read
+        """
+        read = False
+        while channel.recv_ready():
+            stdout(channel.recv(chunk_size))
+            read = True
+        while channel.recv_stderr_ready():
+            stderr(channel.recv_stderr(chunk_size))
+            read = True
+        return read
+
+    def pipe_out(self, command, sink, chunk_size=1024 * 1024):
+        """run command streaming its stdout into file object
+
+        Args:
+            command (str): command to run
+            sink: writable binary file object
+
+        Returns:
+            SSHOut: stdout is empty as it went to sink
+        """
+        channel = self.client.get_transport().open_session()
+        channel.exec_command(command)
+        stderr = []
+
+        while not channel.exit_status_ready():
+            if not self._drain(channel, sink.write, stderr.append, chunk_size):
+                time.sleep(0.01)
+
+        rc = channel.recv_exit_status()
+        self._drain(channel, sink.write, stderr.append, chunk_size)
+        return SSHOut(rc=rc, stdout="", stderr=b"".join(stderr).decode("utf-8", "replace"))
+
+    def pipe_in(self, command, source, chunk_size=1024 * 1024):
+        """run command streaming file object into its stdin
+
+        Args:
+            command (str): command to run
+            source: readable binary file object
+
+        Returns:
+            SSHOut
+        """
+        channel = self.client.get_transport().open_session()
+        channel.exec_command(command)
+        stdout = []
+        stderr = []
+
+        while True:
+            data = source.read(chunk_size)
+            if not data:
+                break
+            sent = 0
+            while sent < len(data) and not channel.exit_status_ready():
+                read = self._drain(channel, stdout.append, stderr.append)
+                if channel.send_ready():
+                    sent += channel.send(data[sent:])
+                elif not read:
+                    time.sleep(0.01)
+            if channel.exit_status_ready():
+                # command gave up reading stdin
+                break
+        channel.shutdown_write()
+
+        while not channel.exit_status_ready():
+            if not self._drain(channel, stdout.append, stderr.append):
+                time.sleep(0.01)
+        rc = channel.recv_exit_status()
+        self._drain(channel, stdout.append, stderr.append)
+        return SSHOut(
+            rc=rc,
+            stdout=b"".join(stdout).decode("utf-8", "replace"),
+            stderr=b"".join(stderr).decode("utf-8", "replace"),
+        )
@@ -0,0 +1,26 @@
+import time
+
+
+class Throttle(object):
+    """Limit throughput of a byte stream
+
+    Call with size of each chunk after it is transferred; sleeps as long as needed to keep
+    average rate under limit.
+
+    Args:
+        rate (int): bytes per second; no limit if None or 0
+    """
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.start = time.monotonic()
+        self.transferred = 0
+
+    def __call__(self, size):
+        if not self.rate:
+            return
+
+        self.transferred += size
+        delay = self.transferred / self.rate - (time.monotonic() - self.start)
+        if delay > 0:
+            time.sleep(delay)
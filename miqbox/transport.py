@@ -0,0 +1,174 @@
+import abc
+import base64
+import json
+import time
+
+import libvirt
+import libvirt_qemu
+
+from miqbox.exception import AgentError
+from miqbox.ssh import SSH
+from miqbox.ssh import SSHOut
+
+# libvirt wait (seconds) for single guest agent command to be answered
+AGENT_TIMEOUT = 10
+
+
+def _decode(data):
+    return base64.b64decode(data).decode("utf-8", "replace") if data else ""
+
+
+def _encode(text):
+    return base64.b64encode(text.encode()).decode() if text else ""
+
+
+class Transport(abc.ABC):
+    """Run commands on appliance
+
+    `SSH` (network) and `Agent` (hypervisor) are interchangeable transports.
+    """
+
+    @abc.abstractmethod
+    def run_command(self, command):
+        """run command with shell
+
+        Returns:
+            SSHOut: rc, stdout, stderr
+        """
+
+    @property
+    @abc.abstractmethod
+    def is_active(self):
+        """check transport is usable"""
+
+
+Transport.register(SSH)
+
+
+class Agent(Transport):
+    """Run commands through qemu guest agent over virtio-serial channel
+
+    Needs no network, address or authentication; works as soon as agent runs in guest.
+
+    Args:
+        domain: libvirt domain
+        timeout (int): seconds to wait for each agent command
+    """
+
+    def __init__(self, domain, timeout=AGENT_TIMEOUT):
+        self.domain = domain
+        self.timeout = timeout
+
+    def execute(self, command, arguments=None):
+        """Send command to guest agent
+
+        Args:
+            command (str): agent command (guest-ping, guest-exec, ...)
+            arguments (dict): command arguments
+
+        Returns:
+            command return value
+
+        Raises:
+            AgentError: agent not connected or command failed
+        """
+        request = {"execute": command}
+        if arguments:
+            request["arguments"] = arguments
+        try:
+            response = libvirt_qemu.qemuAgentCommand(
+                self.domain, json.dumps(request), self.timeout, 0
+            )
+        except libvirt.libvirtError as e:
+            raise AgentError(f"{command}: {e}")
+        return json.loads(response).get("return")
+
+    @property
+    def is_active(self):
+        """check guest agent answers"""
+        try:
+            self.execute("guest-ping")
+            return True
+        except AgentError:
+            return False
+
+    def run_command(self, command, timeout=900):
+        """run command with shell in guest
+
+        Args:
+            command (str): command to run
+            timeout (int): seconds to wait for command to exit
+
+        Returns:
+            SSHOut: rc, stdout, stderr
+
+        Raises:
+            AgentError: agent failed or command not finished in time
+        """
+        pid = self.execute(
+            "guest-exec", {"path": "/bin/sh", "arg": ["-c", command], "capture-output": True}
+        )["pid"]
+        deadline = time.time() + timeout
+        interval = 0.05
+
+        while True:
+            status = self.execute("guest-exec-status", {"pid": pid})
+            if status.get("exited"):
+                break
+            if time.time() > deadline:
+                raise AgentError(f"'{command}' not finished in {timeout}s")
+            time.sleep(interval)
+            interval = min(interval * 2, 1)
+
+        return SSHOut(
+            rc=status.get("exitcode", status.get("signal", -1)),
+            stdout=_decode(status.get("out-data")),
+            stderr=_decode(status.get("err-data")),
+        )
+
+
+class MockAgent(Agent):
+    """Guest agent answering with canned results; for tests without hypervisor
+
+    Args:
+        results (dict): command: (rc, stdout, stderr); other commands exit 127
+        polls (int): guest-exec-status calls before a command reports exited
+    """
+
+    def __init__(self, results=None, polls=0):
+        super(MockAgent, self).__init__(domain=None)
+        self.results = results or {}
+        self.polls = polls
+        self.commands = []
+        self._processes = {}
+
+    def execute(self, command, arguments=None):
+        if command == "guest-ping":
+            return {}
+
+        if command == "guest-exec":
+            shell = arguments["arg"][-1]
+            self.commands.append(shell)
+            pid = len(self.commands)
+            self._processes[pid] = [
+                self.polls,
+                self.results.get(shell, (127, "", f"sh: {shell}: command not found\n")),
+            ]
+            return {"pid": pid}
+
+        if command == "guest-exec-status":
+            process = self._processes.get(arguments["pid"])
+            if process is None:
+                raise AgentError("guest-exec-status: Invalid parameter 'pid'")
+            if process[0] > 0:
+                process[0] -= 1
+                return {"exited": False}
+            rc, stdout, stderr = self._processes.pop(arguments["pid"])[1]
+            return {
+                "exited": True,
+                "exitcode": rc,
+                "out-data": _encode(stdout),
+                "err-data": _encode(stderr),
+            }
+
+        raise AgentError(f"{command}: The command {command} has not been found")
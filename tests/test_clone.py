@@ -0,0 +1,105 @@
+import errno
+import os
+
+import pytest
+
+from miqbox import clone as clone_module
+from miqbox.clone import clone
+
+MIB = 1024 * 1024
+
+
+@pytest.fixture(autouse=True)
+def methods(monkeypatch):
+    monkeypatch.setattr(clone_module, "_methods", {})
+
+
+@pytest.fixture
+def source(tmp_path):
+    """8 MiB file: data, hole, zeros written out, data"""
+    path = tmp_path / "source.img"
+    with open(path, "wb") as f:
+        f.write(b"a" * MIB)
+        f.seek(4 * MIB)
+        f.write(bytes(2 * MIB))
+        f.seek(7 * MIB)
+        f.write(b"b" * MIB)
+    return str(path)
+
+
+def _fake(name, calls, error=None):
+    def method(src, dst, size, progress, throttle):
+        calls.append(name)
+        if error:
+            raise OSError(error, os.strerror(error))
+        progress(size)
+
+    return method
+
+
+def test_fallback_order(monkeypatch, source, tmp_path):
+    calls = []
+    monkeypatch.setattr(
+        clone_module,
+        "METHODS",
+        {
+            "reflink": _fake("reflink", calls, errno.EOPNOTSUPP),
+            "copy_file_range": _fake("copy_file_range", calls, errno.EXDEV),
+            "sparse": _fake("sparse", calls),
+        },
+    )
+
+    assert clone(source, str(tmp_path / "one.img")) == "sparse"
+    assert calls == ["reflink", "copy_file_range", "sparse"]
+
+    # first working method is tried first next time
+    calls.clear()
+    assert clone(source, str(tmp_path / "two.img")) == "sparse"
+    assert calls == ["sparse"]
+
+
+def test_other_errors_raise(monkeypatch, source, tmp_path):
+    calls = []
+    monkeypatch.setattr(
+        clone_module,
+        "METHODS",
+        {"reflink": _fake("reflink", calls, errno.ENOSPC), "sparse": _fake("sparse", calls)},
+    )
+
+    with pytest.raises(OSError):
+        clone(source, str(tmp_path / "clone.img"))
+    assert calls == ["reflink"]
+
+
+def test_forced_method_not_remembered(monkeypatch, source, tmp_path):
+    calls = []
+    monkeypatch.setattr(
+        clone_module,
+        "METHODS",
+        {"copy_file_range": _fake("copy_file_range", calls), "sparse": _fake("sparse", calls)},
+    )
+
+    assert clone(source, str(tmp_path / "one.img"), method="sparse") == "sparse"
+    assert clone(source, str(tmp_path / "two.img")) == "copy_file_range"
+
+
+@pytest.mark.parametrize("method", ["copy_file_range", "sparse"])
+def test_clone_content(method, source, tmp_path):
+    if method not in clone_module.METHODS:
+        pytest.skip(f"{method} not available")
+    destination = str(tmp_path / "clone.img")
+    done = []
+
+    assert clone(source, destination, progress=done.append, method=method) == method
+    with open(source, "rb") as src, open(destination, "rb") as dst:
+        assert src.read() == dst.read()
+    assert sum(done) == os.path.getsize(source)
+
+
+def test_sparse_keeps_holes(source, tmp_path):
+    destination = str(tmp_path / "clone.img")
+    clone(source, destination, method="sparse")
+
+    # hole and zero blocks are not written; only the two data MiB are allocated
+    assert os.path.getsize(destination) == 8 * MIB
+    assert os.stat(destination).st_blocks * 512 <= 4 * MIB
@@ -0,0 +1,45 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from miqbox.domain import appliance_xml
+from miqbox.miq_xmls import METADATA_URI
+
+FIELDS = {
+    "name": "miq-01",
+    "base_img": "miq-01.qcow2",
+    "db_img": "miq-01-db.qcow2",
+    "db_format": "qcow2",
+    "cpu": "2",
+    "memory": "4",
+    "path": "/var/lib/libvirt/images/miqbox",
+    "stream": "manageiq",
+    "provider": "openstack",
+    "version": "ivanchuk",
+}
+
+
+def _channels(xml):
+    return [
+        channel.find("target").get("name")
+        for channel in ET.fromstring(xml).findall("devices/channel")
+    ]
+
+
+@pytest.mark.parametrize("agent", [True, False])
+def test_guest_agent_channel(agent):
+    channels = _channels(appliance_xml(agent=agent, **FIELDS))
+    assert ("org.qemu.guest_agent.0" in channels) is agent
+
+
+def test_labels_metadata():
+    root = ET.fromstring(appliance_xml(labels={"fleet": "lab", "fleet-group": "db"}, **FIELDS))
+    labels = root.find(f"metadata/{{{METADATA_URI}}}labels")
+    assert {label.get("name"): label.get("value") for label in labels} == {
+        "fleet": "lab",
+        "fleet-group": "db",
+    }
+
+
+def test_no_labels_metadata():
+    assert ET.fromstring(appliance_xml(**FIELDS)).find("metadata") is None
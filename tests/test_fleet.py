@@ -0,0 +1,169 @@
+import os
+from collections import namedtuple
+
+import pytest
+from ruamel.yaml import YAML
+
+from miqbox.exception import FleetError
+
+# fleet provisions through libvirt-python bindings
+pytest.importorskip("libvirt")
+
+from miqbox.fleet import Fleet  # noqa: E402
+
+IMAGE = "cfme-rhevm-5.11.0.0-1.x86_64.qcow2"
+
+FakeAppliance = namedtuple("FakeAppliance", ["labels", "cpu", "memory", "is_active"])
+
+
+@pytest.fixture
+def conf(tmp_path):
+    yaml = YAML(typ="safe")
+    with open(os.path.join(os.path.dirname(__file__), "..", "miqbox", "config.yaml")) as f:
+        data = yaml.load(f)
+    data["images"] = str(tmp_path / "images")
+    data["libvirt"]["storage_pool"]["path"] = str(tmp_path / "pool")
+    for directory in ("images", "pool"):
+        os.makedirs(tmp_path / directory)
+    (tmp_path / "images" / IMAGE).touch()
+
+    path = tmp_path / "config.yaml"
+    with open(path, "w") as f:
+        yaml.dump(data, f)
+    return str(path)
+
+
+def _fleet(conf, monkeypatch, appliances, current=None):
+    fleet = Fleet({"fleet": "lab", "appliances": appliances}, conf=conf)
+    monkeypatch.setattr(Fleet, "current", current or {})
+    return fleet
+
+
+def _app(fleet, spec, cpu=None, memory=None, is_active=True, **labels):
+    return FakeAppliance(
+        {**fleet.labels(spec), **labels},
+        cpu or spec.cpu,
+        memory or spec.memory,
+        is_active,
+    )
+
+
+def test_plan_create(conf, monkeypatch):
+    fleet = _fleet(
+        conf,
+        monkeypatch,
+        [
+            {"name": "db", "image": IMAGE},
+            {"name": "worker", "image": IMAGE, "count": "2", "depends_on": ["db"]},
+        ],
+    )
+
+    actions = fleet.plan()
+    assert [(action.kind, action.name) for action in actions] == [
+        ("create", "lab-db-0"),
+        ("create", "lab-worker-0"),
+        ("create", "lab-worker-1"),
+    ]
+    assert actions[0].after == set()
+    assert actions[1].after == {"db"}
+
+
+def test_plan_up_to_date(conf, monkeypatch):
+    fleet = _fleet(conf, monkeypatch, [{"name": "db", "image": IMAGE}])
+    spec = fleet.desired["lab-db-0"]
+    monkeypatch.setattr(Fleet, "current", {spec.name: _app(fleet, spec)})
+
+    assert fleet.plan() == []
+
+
+def test_plan_resize_and_start(conf, monkeypatch):
+    fleet = _fleet(conf, monkeypatch, [{"name": "db", "image": IMAGE, "cpu": 4, "count": 2}])
+    specs = fleet.desired
+    monkeypatch.setattr(
+        Fleet,
+        "current",
+        {
+            "lab-db-0": _app(fleet, specs["lab-db-0"], cpu=2),
+            "lab-db-1": _app(fleet, specs["lab-db-1"], is_active=False),
+        },
+    )
+
+    actions = fleet.plan()
+    assert [(action.kind, action.name, action.changes) for action in actions] == [
+        ("resize", "lab-db-0", [("cpu", 2, 4)]),
+        ("start", "lab-db-1", []),
+    ]
+
+
+def test_plan_recreate(conf, monkeypatch):
+    fleet = _fleet(conf, monkeypatch, [{"name": "db", "image": IMAGE, "db_size": 10}])
+    spec = fleet.desired["lab-db-0"]
+    monkeypatch.setattr(Fleet, "current", {spec.name: _app(fleet, spec, **{"fleet-db_size": "5"})})
+
+    actions = fleet.plan()
+    assert [(action.kind, action.changes) for action in actions] == [
+        ("recreate", [("db_size", "5", "10")])
+    ]
+
+
+def test_plan_remove(conf, monkeypatch):
+    fleet = _fleet(conf, monkeypatch, [{"name": "db", "image": IMAGE}])
+    spec = fleet.desired["lab-db-0"]
+    stale = spec._replace(name="lab-worker-0", group="worker")
+    monkeypatch.setattr(
+        Fleet, "current", {spec.name: _app(fleet, spec), stale.name: _app(fleet, stale)}
+    )
+
+    actions = fleet.plan()
+    assert [(action.kind, action.name) for action in actions] == [("remove", "lab-worker-0")]
+
+
+@pytest.mark.parametrize(
+    "appliances, error",
+    [
+        ([{"name": "db", "image": IMAGE}, {"name": "db", "image": IMAGE}], "more than once"),
+        ([{"name": "db", "image": IMAGE, "count": 0}], "positive integer"),
+        ([{"name": "db", "image": IMAGE, "count": "many"}], "positive integer"),
+        ([{"name": "db", "image": "missing.qcow2"}], "not available"),
+        ([{"name": "db", "image": IMAGE, "depends_on": ["web"]}], "unknown dependencies"),
+        (
+            [
+                {"name": "db", "image": IMAGE, "depends_on": ["web"]},
+                {"name": "web", "image": IMAGE, "depends_on": ["db"]},
+            ],
+            "cycle",
+        ),
+    ],
+)
+def test_invalid_manifest(conf, monkeypatch, appliances, error):
+    fleet = _fleet(conf, monkeypatch, appliances)
+    with pytest.raises(FleetError, match=error):
+        fleet.plan()
+
+
+def test_apply_order(conf, monkeypatch):
+    fleet = _fleet(
+        conf,
+        monkeypatch,
+        [
+            {"name": "db", "image": IMAGE},
+            {"name": "worker", "image": IMAGE, "count": 2, "depends_on": ["db"]},
+        ],
+    )
+    runs = []
+
+    def run(action):
+        runs.append(action.name)
+        if action.group == "db":
+            raise FleetError("boom")
+        return "created"
+
+    monkeypatch.setattr(fleet, "run", run)
+    results = fleet.apply(fleet.plan())
+
+    assert runs == ["lab-db-0"]
+    assert results == {
+        "lab-db-0": (False, "boom"),
+        "lab-worker-0": (False, "skipped; dependency failed"),
+        "lab-worker-1": (False, "skipped; dependency failed"),
+    }
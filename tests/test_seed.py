@@ -0,0 +1,59 @@
+from collections import namedtuple
+
+import pytest
+from ruamel.yaml import YAML
+
+from miqbox.exception import SeedError
+from miqbox.seed import Seed
+
+Credentials = namedtuple("Credentials", ["username", "password"])
+
+
+def safe_load(text):
+    return YAML(typ="safe").load(text)
+
+
+@pytest.fixture
+def seed():
+    return Seed(
+        hostname="miq-01",
+        credentials=Credentials("root", "login pass"),
+        db_password="db pass",
+        ssh_keys=["ssh-ed25519 AAAA user@host"],
+    )
+
+
+def test_meta_data(seed):
+    assert safe_load(seed.meta_data) == {"instance-id": "miq-01", "local-hostname": "miq-01"}
+
+
+def test_user_data(seed):
+    assert seed.user_data.startswith("#cloud-config\n")
+
+    data = safe_load(seed.user_data)
+    assert data["hostname"] == "miq-01"
+    assert data["chpasswd"] == {"list": "root:login pass", "expire": False}
+    assert data["ssh_authorized_keys"] == ["ssh-ed25519 AAAA user@host"]
+    assert data["runcmd"] == [
+        "appliance_console_cli --region 0 --internal --force-key -p 'db pass' --dbdisk /dev/vdb"
+    ]
+
+
+def test_user_data_without_database(seed):
+    seed.region = None
+    seed.ssh_keys = []
+
+    data = safe_load(seed.user_data)
+    assert "runcmd" not in data
+    assert "ssh_authorized_keys" not in data
+
+
+def test_files(seed):
+    assert seed.files == {"meta-data": seed.meta_data, "user-data": seed.user_data}
+
+
+def test_write_without_iso_tool(seed, monkeypatch, tmp_path):
+    monkeypatch.setattr("shutil.which", lambda tool: None)
+
+    with pytest.raises(SeedError):
+        seed.write(str(tmp_path / "seed.iso"))
@@ -0,0 +1,57 @@
+import pytest
+
+from miqbox.exception import AgentError
+from miqbox.ssh import SSH
+from miqbox.ssh import SSHOut
+
+# guest agent transport is built on libvirt-python bindings
+pytest.importorskip("libvirt_qemu")
+
+from miqbox.transport import MockAgent  # noqa: E402
+from miqbox.transport import Transport  # noqa: E402
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("miqbox.transport.time.sleep", sleeps.append)
+    return sleeps
+
+
+def test_transports():
+    assert issubclass(SSH, Transport)
+    assert isinstance(MockAgent(), Transport)
+    assert MockAgent().is_active
+
+
+def test_run_command(sleeps):
+    agent = MockAgent({"systemctl is-active evmserverd": (0, "active\n", "")})
+
+    out = agent.run_command("systemctl is-active evmserverd")
+    assert out == SSHOut(rc=0, stdout="active\n", stderr="")
+    assert agent.commands == ["systemctl is-active evmserverd"]
+    assert not sleeps
+
+
+def test_run_unknown_command(sleeps):
+    out = MockAgent().run_command("foo")
+    assert out.rc == 127
+    assert out.stdout == ""
+    assert "command not found" in out.stderr
+
+
+def test_run_command_polls(sleeps):
+    agent = MockAgent({"uptime": (0, "up 1 day\n", "")}, polls=4)
+
+    assert agent.run_command("uptime").stdout == "up 1 day\n"
+    assert sleeps == [0.05, 0.1, 0.2, 0.4]
+
+
+def test_run_command_timeout(sleeps):
+    with pytest.raises(AgentError):
+        MockAgent(polls=1).run_command("sleep 60", timeout=-1)
+
+
+def test_unknown_agent_command():
+    with pytest.raises(AgentError):
+        MockAgent().execute("guest-shutdown")